@@ -1,16 +1,21 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Depends
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
+from pathlib import Path
 from pydantic import BaseModel
-from starlette.responses import Response
+from starlette.responses import FileResponse
 
 from ..storage.file_system import FileSystemManager
+from ..config.storage import storage_settings
 
 router = APIRouter(prefix="/files", tags=["文件管理"])
 
 # 创建文件管理器实例
 file_manager = FileSystemManager()
 
+# 允许访问的目录，由FastAPI在进入路由前校验
+Directory = Literal['har', 'processed', 'reports']
+
 class FileInfo(BaseModel):
     """文件信息"""
     name: str
@@ -25,9 +30,17 @@ class StorageStats(BaseModel):
     total_size: int
     file_count: int
 
+def _resolve_file_path(directory: str, filename: str) -> Optional[Path]:
+    """解析文件的实际路径，防止目录穿越；文件不存在时返回None"""
+    base_dir = storage_settings.get_directory_path(directory).resolve()
+    file_path = (base_dir / filename).resolve()
+    if file_path.parent != base_dir or not file_path.is_file():
+        return None
+    return file_path
+
 @router.post("/upload/{directory}", response_model=FileInfo)
 async def upload_file(
-    directory: str,
+    directory: Directory,
     file: UploadFile = File(...),
 ):
     """上传文件
@@ -37,32 +50,27 @@ async def upload_file(
         file: 上传的文件
     """
     try:
-        if directory not in ['har', 'processed', 'reports']:
-            raise HTTPException(status_code=400, detail="Invalid directory")
-            
         result = await file_manager.save_upload_file(file, directory)
         return FileInfo(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/list/{directory}", response_model=List[FileInfo])
-async def list_files(directory: str):
+# 文件信息来自内部file_manager，跳过逐字段校验，仅在文档中声明响应模型
+@router.get("/list/{directory}", response_model=None, responses={200: {"model": List[FileInfo]}})
+async def list_files(directory: Directory):
     """列出目录中的文件
     
     Args:
         directory: 目录名(har/processed/reports)
     """
     try:
-        if directory not in ['har', 'processed', 'reports']:
-            raise HTTPException(status_code=400, detail="Invalid directory")
-            
         files = await file_manager.list_files(directory)
-        return [FileInfo(**f) for f in files]
+        return [FileInfo.construct(**f) for f in files]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/download/{directory}/{filename}")
-async def download_file(directory: str, filename: str):
+async def download_file(directory: Directory, filename: str):
     """下载文件
     
     Args:
@@ -70,25 +78,21 @@ async def download_file(directory: str, filename: str):
         filename: 文件名
     """
     try:
-        if directory not in ['har', 'processed', 'reports']:
-            raise HTTPException(status_code=400, detail="Invalid directory")
-            
-        content = await file_manager.get_file_content(directory, filename)
-        if not content:
+        file_path = _resolve_file_path(directory, filename)
+        if file_path is None:
             raise HTTPException(status_code=404, detail="File not found")
             
-        return Response(
-            content=content,
-            media_type='application/octet-stream',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"'
-            }
+        # FileResponse按块发送文件（服务器支持时走sendfile），不把整个文件读入内存
+        return FileResponse(
+            path=file_path,
+            filename=filename,
+            media_type='application/octet-stream'
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{directory}/{filename}")
-async def delete_file(directory: str, filename: str):
+async def delete_file(directory: Directory, filename: str):
     """删除文件
     
     Args:
@@ -96,9 +100,6 @@ async def delete_file(directory: str, filename: str):
         filename: 文件名
     """
     try:
-        if directory not in ['har', 'processed', 'reports']:
-            raise HTTPException(status_code=400, detail="Invalid directory")
-            
         if await file_manager.delete_file(directory, filename):
             return {"message": "File deleted"}
         raise HTTPException(status_code=404, detail="File not found")
@@ -107,7 +108,7 @@ async def delete_file(directory: str, filename: str):
 
 @router.post("/cleanup/{directory}")
 async def cleanup_files(
-    directory: str,
+    directory: Directory,
     days: int = Query(30, description="保留最近几天的文件")
 ):
     """清理旧文件
@@ -117,9 +118,6 @@ async def cleanup_files(
         days: 保留最近几天的文件
     """
     try:
-        if directory not in ['har', 'processed', 'reports']:
-            raise HTTPException(status_code=400, detail="Invalid directory")
-            
         await file_manager.cleanup_old_files(directory, days)
         return {"message": "Cleanup completed"}
     except Exception as e:
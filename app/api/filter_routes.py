@@ -3,7 +3,11 @@ from pydantic import BaseModel
 from typing import List, Optional
 from bson import ObjectId
 from app.db.mongo_client import get_database
+from app.proxy.matcher import compile_rules
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import DeleteMany, InsertOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from functools import lru_cache
 import re
 
 router = APIRouter(prefix="/filters", tags=["filters"])
@@ -318,12 +322,57 @@ PRESET_RULES = {
     }
 }
 
-@router.get("")
+# 预设规则在模块加载时预编译，匹配时直接复用Pattern对象
+_COMPILED_PRESETS = {
+    pid: [(re.compile(r["pattern"]), r) for r in p["rules"]]
+    for pid, p in PRESET_RULES.items()
+}
+
+def get_compiled_preset(preset_id: str) -> List[tuple]:
+    """获取预编译的预设规则列表 [(Pattern, rule), ...]"""
+    return _COMPILED_PRESETS.get(preset_id, [])
+
+# 每个预设按类型构建的多模式匹配器: _UNION_BY_TYPE[preset_id][type]
+_UNION_BY_TYPE = {pid: compile_rules(p["rules"]) for pid, p in PRESET_RULES.items()}
+
+def match_preset(preset_id: str, rule_type: str, target: str) -> bool:
+    """检查目标是否命中指定预设中某类型的任一规则"""
+    matcher = _UNION_BY_TYPE.get(preset_id, {}).get(rule_type)
+    return matcher is not None and matcher.any_match(target)
+
+@lru_cache(maxsize=1024)
+def _validate(pattern: str) -> re.Pattern:
+    """校验并缓存正则表达式，非法时抛出re.error"""
+    return re.compile(pattern)
+
+def _is_valid_pattern(pattern: str) -> bool:
+    try:
+        _validate(pattern)
+        return True
+    except re.error:
+        return False
+
+async def _check_rule_set(db: AsyncIOMotorDatabase, rule: FilterRule, exclude_id: Optional[ObjectId] = None):
+    """写入前将新规则与同类型已启用规则一起编译，失败时抛出re.error，规则不会写入
+    
+    数据库中遗留的非法规则与代理加载时一样跳过，不影响新规则的写入。
+    """
+    query = {"enabled": True, "type": rule.type}
+    if exclude_id is not None:
+        query["_id"] = {"$ne": exclude_id}
+    rules = await db.filter_rules.find(query, {"pattern": 1, "type": 1}).to_list(None)
+    rules = [r for r in rules if _is_valid_pattern(r["pattern"])]
+    if rule.enabled:
+        rules.append(rule.dict())
+    compile_rules(rules)
+
+@router.get("", response_model=None, responses={200: {"model": List[FilterRuleInDB]}})
 async def list_rules(db: AsyncIOMotorDatabase = Depends(get_database)) -> List[FilterRuleInDB]:
     """获取过滤规则列表"""
     rules = []
     async for rule in db.filter_rules.find():
-        rules.append(FilterRuleInDB(
+        # 数据库中的规则写入前已校验，这里跳过重复校验
+        rules.append(FilterRuleInDB.construct(
             id=str(rule["_id"]),
             pattern=rule["pattern"],
             type=rule["type"],
@@ -337,12 +386,15 @@ async def add_rule(rule: FilterRule, db: AsyncIOMotorDatabase = Depends(get_data
     """添加过滤规则"""
     try:
         # 验证正则表达式
-        re.compile(rule.pattern)
+        _validate(rule.pattern)
+        await _check_rule_set(db, rule)
         
         result = await db.filter_rules.insert_one(rule.dict())
         return {"id": str(result.inserted_id)}
     except re.error:
         raise HTTPException(status_code=400, detail="无效的正则表达式")
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="该规则已存在")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -351,7 +403,8 @@ async def update_rule(rule_id: str, rule: FilterRule, db: AsyncIOMotorDatabase =
     """更新过滤规则"""
     try:
         # 验证正则表达式
-        re.compile(rule.pattern)
+        _validate(rule.pattern)
+        await _check_rule_set(db, rule, exclude_id=ObjectId(rule_id))
         
         result = await db.filter_rules.update_one(
             {"_id": ObjectId(rule_id)},
@@ -364,6 +417,8 @@ async def update_rule(rule_id: str, rule: FilterRule, db: AsyncIOMotorDatabase =
         return {"message": "规则更新成功"}
     except re.error:
         raise HTTPException(status_code=400, detail="无效的正则表达式")
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="该规则已存在")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -417,15 +472,19 @@ async def apply_preset(preset_id: str, db: AsyncIOMotorDatabase = Depends(get_da
     try:
         preset = PRESET_RULES[preset_id]
         
-        # 删除现有的同类型规则
-        await db.filter_rules.delete_many({
+        # 删除现有的同类型规则并插入预设规则，一次往返按顺序执行
+        # 插入副本，避免驱动向模块级PRESET_RULES写入_id
+        ops = [DeleteMany({
             "type": {"$in": [rule["type"] for rule in preset["rules"]]}
-        })
-        
-        # 插入预设规则
-        if preset["rules"]:
-            await db.filter_rules.insert_many(preset["rules"])
+        })]
+        ops.extend(InsertOne(dict(rule)) for rule in preset["rules"])
+        await db.filter_rules.bulk_write(ops, ordered=True)
         
         return {"message": "预设规则应用成功"}
+    except BulkWriteError as e:
+        # 并发应用预设等情况下命中(pattern, type)唯一索引
+        if any(err.get("code") == 11000 for err in e.details.get("writeErrors", [])):
+            raise HTTPException(status_code=400, detail="该规则已存在")
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
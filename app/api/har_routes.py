@@ -2,7 +2,11 @@ from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Depends
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+from collections import Counter
+import asyncio
 import os
+import tempfile
+import orjson
 
 from fastapi.responses import FileResponse
 from app.parser.doc_generator import APIDocGenerator
@@ -10,16 +14,28 @@ from app.storage.file_system import FileSystemManager
 
 from ..storage.file_manager import FileManager
 from ..parser.har_parser import HARParser
+from ..config.storage import storage_settings
+from ..services.traffic_aggregator import aggregator
 from ..dependencies import get_traffic_dao
 from ..db.mongo_crud import TrafficRecordDAO
-from ..models.mongo_models import TrafficRecord
 from ..dependencies import get_api_dao
 from ..db.mongo_crud import APIEndpointDAO
 
 router = APIRouter(prefix="/api/har", tags=["HAR处理"])
 
+# 批量写入MongoDB的批次大小
+INSERT_BATCH_SIZE = 500
+# 上传文件流式写盘的块大小
+UPLOAD_CHUNK_SIZE = 1 << 20
+
 file_manager = FileManager()
 har_parser = HARParser()
+doc_generator = APIDocGenerator()
+
+# 报告目录在模块加载时解析并创建，各接口直接复用
+report_fs = FileSystemManager()
+REPORTS_DIR = report_fs.get_dir_path('reports')
+os.makedirs(REPORTS_DIR, exist_ok=True)
 
 class HARFileInfo(BaseModel):
     """HAR文件信息"""
@@ -100,44 +116,49 @@ async def process_har_file(
         if not file_path:
             raise HTTPException(status_code=404, detail="文件不存在")
             
-        # 解析HAR文件
-        entries = har_parser.parse_file(file_path, host_filter)
+        # 流式解析HAR文件，边解析边写入处理结果，同时统计信息
+        processed_dir = storage_settings.get_directory_path('processed')
+        processed_dir.mkdir(parents=True, exist_ok=True)
+        processed_file = processed_dir / f"{os.path.splitext(filename)[0]}_processed.json"
         
-        # 统计信息
-        host_stats = {}
-        api_paths = set()
+        host_counts = Counter()
+        host_method_counts = Counter()
+        api_paths = {}  # 按首次出现顺序去重
+        total = 0
         
-        for entry in entries:
-            host = entry['host']
-            if host not in host_stats:
-                host_stats[host] = {'count': 0, 'methods': {}}
-            
-            host_stats[host]['count'] += 1
-            method = entry['method']
-            if method not in host_stats[host]['methods']:
-                host_stats[host]['methods'][method] = 0
-            host_stats[host]['methods'][method] += 1
-            
-            api_paths.add(f"{entry['method']} {entry['path']}")
-            
-        # 保存处理后的数据
-        processed_data = {
-            'entries': entries,
-            'stats': {
-                'total_requests': len(entries),
+        with open(processed_file, 'wb') as out:
+            out.write(b'{"entries":[')
+            for entry in har_parser.iter_entries(file_path, host_filter):
+                if total:
+                    out.write(b',')
+                out.write(orjson.dumps(entry))
+                total += 1
+                
+                host = entry['host']
+                method = entry['method']
+                host_counts[host] += 1
+                host_method_counts[(host, method)] += 1
+                api_paths[f"{method} {entry['path']}"] = None
+                
+            # 循环结束后一次性构建嵌套的host统计
+            host_stats = {host: {'count': count, 'methods': {}} for host, count in host_counts.items()}
+            for (host, method), count in host_method_counts.items():
+                host_stats[host]['methods'][method] = count
+                
+            out.write(b'],"stats":')
+            out.write(orjson.dumps({
+                'total_requests': total,
                 'host_stats': host_stats,
                 'unique_apis': len(api_paths)
-            }
-        }
-        
-        processed_file = file_manager.save_processed_data(processed_data, filename)
+            }))
+            out.write(b'}')
         
         return ProcessedResult(
             original_file=filename,
             processed_file=os.path.basename(processed_file),
-            request_count=len(entries),
+            request_count=total,
             host_stats=host_stats,
-            api_paths=sorted(list(api_paths))
+            api_paths=list(api_paths)
         )
         
     except Exception as e:
@@ -155,39 +176,46 @@ async def parse_and_store_har(
     try:
         if not file.filename.endswith('.har'):
             raise HTTPException(status_code=400, detail="只支持.har文件")
-        content = await file.read()
-        import tempfile
+        # 分块写入临时文件，避免整个HAR文件读入内存
         with tempfile.NamedTemporaryFile(delete=False, suffix='.har') as tmp:
-            tmp.write(content)
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                tmp.write(chunk)
             tmp_path = tmp.name
-        entries = har_parser.parse_file(tmp_path, host_filter)
-        os.remove(tmp_path)
         inserted = 0
         sample = []
-        for entry in entries:
-            record = TrafficRecord(
-                host=entry['host'],
-                path=entry['path'],
-                method=entry['method'],
-                url=entry['url'],
-                request_headers=entry['request_headers'],
-                request_params=entry.get('request_params'),
-                request_body=entry.get('request_body'),
-                response_status=entry['response_status'],
-                response_headers=entry['response_headers'],
-                response_body=entry.get('response_body'),
-                timing=entry['timing'],
-                har_file=file.filename
-            )
-            await traffic_dao.create(record)
-            inserted += 1
-            if len(sample) < 3:
-                sample.append({
-                    'host': record.host,
-                    'path': record.path,
-                    'method': record.method,
-                    'status': record.response_status
-                })
+        batch = []
+        try:
+            for entry in har_parser.iter_entries(tmp_path, host_filter):
+                # 解析器输出字段固定，直接构造文档，跳过TrafficRecord校验
+                doc = {
+                    'host': entry['host'],
+                    'path': entry['path'],
+                    'method': entry['method'],
+                    'url': entry['url'],
+                    'request_headers': entry['request_headers'],
+                    'request_params': entry.get('request_params'),
+                    'request_body': entry.get('request_body'),
+                    'response_status': entry['response_status'],
+                    'response_headers': entry['response_headers'],
+                    'response_body': entry.get('response_body'),
+                    'timing': entry['timing'],
+                    'har_file': file.filename
+                }
+                batch.append(doc)
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    inserted += await traffic_dao.create_many_raw(batch)
+                    batch = []
+                if len(sample) < 3:
+                    sample.append({
+                        'host': doc['host'],
+                        'path': doc['path'],
+                        'method': doc['method'],
+                        'status': doc['response_status']
+                    })
+            if batch:
+                inserted += await traffic_dao.create_many_raw(batch)
+        finally:
+            os.remove(tmp_path)
         return ParseAndStoreResult(inserted_count=inserted, sample_records=sample)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -202,56 +230,16 @@ async def delete_har_file(filename: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
 
-@router.get("/aggregate", response_model=List[AggregatedAPI])
+@router.get("/aggregate", response_model=None, responses={200: {"model": List[AggregatedAPI]}})
 async def aggregate_apis(
     traffic_dao: TrafficRecordDAO = Depends(get_traffic_dao)
 ):
     """
     聚合API流量记录，按(host, path, method)分组，统计参数和响应
+    
+    聚合结果由服务端管道生成，结构与AggregatedAPI一致，直接返回不再逐项校验
     """
-    from collections import defaultdict
-    from bson import ObjectId
-    db = traffic_dao.db
-    pipeline = [
-        {"$group": {
-            "_id": {"host": "$host", "path": "$path", "method": "$method"},
-            "records": {"$push": "$ROOT"},
-            "count": {"$sum": 1}
-        }}
-    ]
-    result = []
-    async for group in db.traffic_records.aggregate(pipeline):
-        _id = group["_id"]
-        records = group["records"]
-        # 参数聚合
-        param_info = defaultdict(lambda: {"types": set(), "examples": set()})
-        for rec in records:
-            params = rec.get("request_params") or {}
-            for k, v in params.items():
-                param_info[k]["examples"].add(str(v))
-                param_info[k]["types"].add(type(v).__name__)
-        params = [AggregatedParam(name=k, types=list(v["types"]), examples=list(v["examples"])) for k, v in param_info.items()]
-        # 响应聚合
-        resp_info = defaultdict(lambda: {"schemas": set(), "examples": []})
-        for rec in records:
-            status = rec.get("response_status")
-            body = rec.get("response_body")
-            key = status
-            # 简单用str(body)做schema聚合（可扩展为hash/结构分析）
-            schema_str = str(type(body))
-            resp_info[key]["schemas"].add(schema_str)
-            if body is not None and len(resp_info[key]["examples"]) < 3:
-                resp_info[key]["examples"].append(body)
-        responses = [AggregatedResponse(status=k, schemas=list(v["schemas"]), examples=v["examples"]) for k, v in resp_info.items()]
-        result.append(AggregatedAPI(
-            host=_id["host"],
-            path=_id["path"],
-            method=_id["method"],
-            params=params,
-            responses=responses,
-            count=group["count"]
-        ))
-    return result 
+    return await aggregator.get(traffic_dao.db)
 
 @router.post("/generate_doc")
 async def generate_api_doc(
@@ -261,69 +249,39 @@ async def generate_api_doc(
     聚合所有流量记录，生成API文档（markdown/html/openapi），保存到reports目录
     """
     # 1. 聚合API
-    from collections import defaultdict
-    db = traffic_dao.db
-    pipeline = [
-        {"$group": {
-            "_id": {"host": "$host", "path": "$path", "method": "$method"},
-            "records": {"$push": "$ROOT"},
-            "count": {"$sum": 1}
-        }}
-    ]
-    apis = []
-    async for group in db.traffic_records.aggregate(pipeline):
-        _id = group["_id"]
-        records = group["records"]
-        # 参数聚合
-        param_info = defaultdict(lambda: {"types": set(), "examples": set()})
-        for rec in records:
-            params = rec.get("request_params") or {}
-            for k, v in params.items():
-                param_info[k]["examples"].add(str(v))
-                param_info[k]["types"].add(type(v).__name__)
-        params = [{"name": k, "types": list(v["types"]), "examples": list(v["examples"])} for k, v in param_info.items()]
-        # 响应聚合
-        resp_info = defaultdict(lambda: {"schemas": set(), "examples": []})
-        for rec in records:
-            status = rec.get("response_status")
-            body = rec.get("response_body")
-            key = status
-            schema_str = str(type(body))
-            resp_info[key]["schemas"].add(schema_str)
-            if body is not None and len(resp_info[key]["examples"]) < 3:
-                resp_info[key]["examples"].append(body)
-        responses = [{"status": k, "schemas": list(v["schemas"]), "examples": v["examples"]} for k, v in resp_info.items()]
-        apis.append({
-            "host": _id["host"],
-            "path": _id["path"],
-            "method": _id["method"],
-            "params": params,
-            "responses": responses,
-            "count": group["count"]
-        })
+    apis = await aggregator.get(traffic_dao.db)
     # 2. 生成文档
-    doc_gen = APIDocGenerator()
-    reports_dir = FileSystemManager().get_dir_path('reports')
-    os.makedirs(reports_dir, exist_ok=True)
-    doc_gen.save_docs(apis, reports_dir, formats=["markdown", "openapi", "html"])
-    return {"message": "API文档已生成", "files": os.listdir(reports_dir)}
+    # 各格式的渲染和写盘在线程池中并发执行，避免阻塞事件循环
+    await doc_generator.save_docs_async(
+        apis, REPORTS_DIR, formats=["markdown", "openapi", "html"]
+    )
+    return {"message": "API文档已生成", "files": await _list_report_files(REPORTS_DIR)}
+
+def _scan_files(directory: str) -> List[str]:
+    """列出目录下的文件名，DirEntry自带文件类型信息，无需额外stat"""
+    try:
+        with os.scandir(directory) as it:
+            return [entry.name for entry in it if entry.is_file()]
+    except FileNotFoundError:
+        return []
+
+async def _list_report_files(reports_dir: str) -> List[str]:
+    """在线程池中扫描目录，避免阻塞事件循环"""
+    return await asyncio.to_thread(_scan_files, reports_dir)
 
 @router.get("/doc_list")
 async def list_api_docs():
     """
     列出已生成的API文档文件
     """
-    reports_dir = FileSystemManager().get_dir_path('reports')
-    files = os.listdir(reports_dir) if os.path.exists(reports_dir) else []
-    return {"files": files}
+    return {"files": await _list_report_files(REPORTS_DIR)}
 
 @router.get("/doc/{filename}")
 async def download_api_doc(filename: str):
     """
     下载指定API文档
     """
-    reports_dir = FileSystemManager().get_dir_path('reports')
-    file_path = os.path.join(reports_dir, filename)
+    file_path = os.path.join(REPORTS_DIR, filename)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="文件不存在")
     return FileResponse(file_path, filename=filename) 
\ No newline at end of file
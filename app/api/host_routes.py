@@ -2,12 +2,35 @@ from fastapi import APIRouter, HTTPException, Depends, Body
 from pydantic import BaseModel, validator
 from typing import List, Optional
 from bson import ObjectId
-from app.db.mongo_client import get_database
+from bson.errors import InvalidId
+from app.db.mongo_client import get_database, mongo_manager
+from app.services.host_rule_cache import host_rule_cache
 from motor.motor_asyncio import AsyncIOMotorDatabase
-import re
+from pymongo.errors import DuplicateKeyError
+from pymongo.write_concern import WriteConcern
+from operator import itemgetter
 
 router = APIRouter(prefix="/filters/hosts", tags=["hosts"])
 
+# 域名字符分类表：1=字母数字, 2='-', 3='.', 0=非法字符
+_HOST_CHAR_TABLE = bytes(
+    1 if chr(i).isascii() and chr(i).isalnum() else 2 if i == 0x2d else 3 if i == 0x2e else 0
+    for i in range(256)
+)
+
+def is_valid_host(host: str) -> bool:
+    """校验域名格式：每段以字母数字开头，仅含字母数字和'-'，段长≤63，总长≤253"""
+    if not host or len(host) > 253 or not host.isascii():
+        return False
+    classes = host.encode('ascii').translate(_HOST_CHAR_TABLE)
+    if b'\x00' in classes:
+        return False
+    # 只在段边界上循环
+    for label in classes.split(b'\x03'):
+        if not label or label[0] != 1 or len(label) > 63:
+            return False
+    return True
+
 class HostRule(BaseModel):
     host: str
     enabled: bool
@@ -16,75 +39,108 @@ class HostRule(BaseModel):
     
     @validator('host')
     def validate_host(cls, v):
-        pattern = r'^[a-zA-Z0-9][-a-zA-Z0-9]*(\.[a-zA-Z0-9][-a-zA-Z0-9]*)*$'
-        if not re.match(pattern, v):
+        if not is_valid_host(v):
             raise ValueError('Invalid host format')
         return v
 
 class HostRuleInDB(HostRule):
     id: str
 
+# Host规则是可随时重建的配置数据，写入只需主节点确认，不等待多数节点和journal
+_HOST_RULES_WRITE_CONCERN = WriteConcern(w=1, j=False)
+
+def _host_rules(db: AsyncIOMotorDatabase):
+    """获取使用轻量写关注的host_rules集合"""
+    return db.host_rules.with_options(write_concern=_HOST_RULES_WRITE_CONCERN)
+
+def _parse_oid(rule_id: str) -> ObjectId:
+    """解析规则ID，格式非法时返回400"""
+    try:
+        return ObjectId(rule_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="无效的规则ID")
+
+_host_fields = itemgetter("_id", "host", "enabled", "description", "includeSubdomains")
+
 @router.get("")
 async def list_hosts(db: AsyncIOMotorDatabase = Depends(get_database)) -> List[HostRuleInDB]:
     """获取Host规则列表"""
-    rules = []
-    async for rule in db.host_rules.find():
-        rules.append(HostRuleInDB(
-            id=str(rule["_id"]),
-            host=rule["host"],
-            enabled=rule["enabled"],
-            description=rule.get("description"),
-            includeSubdomains=rule.get("includeSubdomains", False)
-        ))
-    return rules
+    docs = await host_rule_cache.get(db)
+    return [
+        HostRuleInDB(
+            id=str(_id),
+            host=host,
+            enabled=enabled,
+            description=description,
+            includeSubdomains=include_subdomains
+        )
+        for _id, host, enabled, description, include_subdomains in map(_host_fields, docs)
+    ]
+
+async def _check_duplicate_host(db: AsyncIOMotorDatabase, host: str, exclude_id: Optional[ObjectId] = None):
+    """host唯一索引未确认创建成功时，写入前先查询域名是否已存在"""
+    if mongo_manager.has_index("host_rules", "host_1"):
+        return
+    query = {"host": host}
+    if exclude_id is not None:
+        query["_id"] = {"$ne": exclude_id}
+    if await db.host_rules.find_one(query, {"_id": 1}):
+        raise HTTPException(status_code=400, detail="该域名已存在")
 
 @router.post("")
 async def add_host(rule: HostRule, db: AsyncIOMotorDatabase = Depends(get_database)):
     """添加Host规则"""
     try:
-        # 检查域名是否已存在
-        existing = await db.host_rules.find_one({"host": rule.host})
-        if existing:
-            raise HTTPException(status_code=400, detail="该域名已存在")
-        
-        result = await db.host_rules.insert_one(rule.dict())
+        # 域名唯一性由host唯一索引保证，索引缺失时先查询
+        await _check_duplicate_host(db, rule.host)
+        payload = rule.dict()
+        result = await _host_rules(db).insert_one(payload)
+        host_rule_cache.invalidate()
         return {"id": str(result.inserted_id)}
+    except HTTPException:
+        raise
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="该域名已存在")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{rule_id}")
 async def update_host(rule_id: str, rule: HostRule, db: AsyncIOMotorDatabase = Depends(get_database)):
     """更新Host规则"""
+    oid = _parse_oid(rule_id)
     try:
-        # 检查域名是否已存在（排除当前规则）
-        existing = await db.host_rules.find_one({
-            "_id": {"$ne": ObjectId(rule_id)},
-            "host": rule.host
-        })
-        if existing:
-            raise HTTPException(status_code=400, detail="该域名已存在")
-        
-        result = await db.host_rules.update_one(
-            {"_id": ObjectId(rule_id)},
-            {"$set": rule.dict()}
+        # 域名与其他规则重复时由host唯一索引拒绝，索引缺失时先查询
+        await _check_duplicate_host(db, rule.host, oid)
+        payload = rule.dict()
+        result = await _host_rules(db).update_one(
+            {"_id": oid},
+            {"$set": payload}
         )
         
-        if result.modified_count == 0:
+        # 用matched_count判断是否存在，内容未变化的更新不应返回404
+        if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="规则不存在")
         
+        host_rule_cache.invalidate()
         return {"message": "规则更新成功"}
+    except HTTPException:
+        raise
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="该域名已存在")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{rule_id}")
 async def delete_host(rule_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """删除Host规则"""
+    oid = _parse_oid(rule_id)
     try:
-        result = await db.host_rules.delete_one({"_id": ObjectId(rule_id)})
+        result = await _host_rules(db).delete_one({"_id": oid})
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="规则不存在")
         
+        host_rule_cache.invalidate()
         return {"message": "规则删除成功"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -96,13 +152,18 @@ async def toggle_host(
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """启用/禁用Host规则"""
+    oid = _parse_oid(rule_id)
     try:
-        result = await db.host_rules.update_one(
-            {"_id": ObjectId(rule_id)},
+        result = await _host_rules(db).update_one(
+            {"_id": oid},
             {"$set": {"enabled": enabled}}
         )
-        if result.modified_count == 0:
+        # 与update_host一致，规则已处于目标状态时不应返回404
+        if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="规则不存在")
+        host_rule_cache.invalidate()
         return {"message": f"规则已{'启用' if enabled else '禁用'}"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -16,6 +16,22 @@ class ProxyConfig(BaseModel):
     enableHttps: bool
     certPath: Optional[str] = None
 
+# 测试过滤规则时使用的模拟HTTPFlow对象
+class _MockRequest:
+    __slots__ = ('pretty_url', 'pretty_host', 'headers', 'method')
+    
+    def __init__(self, url: str):
+        self.pretty_url = url
+        self.pretty_host = "www.aiyuyue.cn"
+        self.headers = {"Content-Type": "application/font-woff"}
+        self.method = "GET"
+
+class _MockFlow:
+    __slots__ = ('request',)
+    
+    def __init__(self, url: str):
+        self.request = _MockRequest(url)
+
 # 全局代理服务实例
 proxy_server = ProxyServer()
 cert_manager = CertificateManager()
@@ -61,7 +77,7 @@ async def stop_proxy():
             proxy_server.clear_system_proxy()
 
         # 停止代理服务
-        proxy_server.stop()
+        await proxy_server.stop()
         return {"message": "代理服务已停止"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -165,18 +181,7 @@ async def test_filter_rule():
         test_url = "http://www.aiyuyue.cn/content/font/fontawesome-webfontf77b.woff?v=3.2.1"
         
         # 模拟HTTPFlow对象
-        class MockFlow:
-            def __init__(self, url):
-                self.request = MockRequest(url)
-        
-        class MockRequest:
-            def __init__(self, url):
-                self.pretty_url = url
-                self.pretty_host = "www.aiyuyue.cn"
-                self.headers = {"Content-Type": "application/font-woff"}
-                self.method = "GET"
-        
-        mock_flow = MockFlow(test_url)
+        mock_flow = _MockFlow(test_url)
         
         # 测试过滤规则
         should_filter = proxy_server.traffic_handler._should_filter_request(mock_flow)
@@ -1,4 +1,5 @@
-from pydantic import BaseSettings
+from pydantic import BaseSettings, PrivateAttr
+from typing import Dict
 from pathlib import Path
 import os
 
@@ -23,42 +24,50 @@ class StorageSettings(BaseSettings):
     REPORTS_RETENTION_DAYS: int = 180
     TEMP_RETENTION_DAYS: int = 1
     
-    # 支持的文件类型
-    ALLOWED_EXTENSIONS: set = {'.har', '.json', '.html', '.pdf'}
+    # 支持的文件类型(不含前导点)
+    ALLOWED_EXTENSIONS: frozenset = frozenset({'har', 'json', 'html', 'pdf'})
     
     class Config:
         env_prefix = "STORAGE_"
         
+    # 目录名到路径/保留天数的映射，实例化时构建
+    _dirs: Dict[str, Path] = PrivateAttr()
+    _retention_days: Dict[str, int] = PrivateAttr()
+    
+    def __init__(self, **data):
+        super().__init__(**data)
+        base_dir = Path(self.BASE_DIR)
+        self._dirs = {
+            'har': base_dir / self.HAR_DIR,
+            'processed': base_dir / self.PROCESSED_DIR,
+            'reports': base_dir / self.REPORTS_DIR,
+            'temp': base_dir / self.TEMP_DIR,
+        }
+        self._retention_days = {
+            'har': self.HAR_RETENTION_DAYS,
+            'processed': self.PROCESSED_RETENTION_DAYS,
+            'reports': self.REPORTS_RETENTION_DAYS,
+            'temp': self.TEMP_RETENTION_DAYS,
+        }
+        
     def get_directory_path(self, directory: str) -> Path:
         """获取目录路径"""
-        base_dir = Path(self.BASE_DIR)
-        if directory == 'har':
-            return base_dir / self.HAR_DIR
-        elif directory == 'processed':
-            return base_dir / self.PROCESSED_DIR
-        elif directory == 'reports':
-            return base_dir / self.REPORTS_DIR
-        elif directory == 'temp':
-            return base_dir / self.TEMP_DIR
-        else:
+        try:
+            return self._dirs[directory]
+        except KeyError:
             raise ValueError(f"Invalid directory: {directory}")
             
     def get_retention_days(self, directory: str) -> int:
         """获取文件保留天数"""
-        if directory == 'har':
-            return self.HAR_RETENTION_DAYS
-        elif directory == 'processed':
-            return self.PROCESSED_RETENTION_DAYS
-        elif directory == 'reports':
-            return self.REPORTS_RETENTION_DAYS
-        elif directory == 'temp':
-            return self.TEMP_RETENTION_DAYS
-        else:
+        try:
+            return self._retention_days[directory]
+        except KeyError:
             raise ValueError(f"Invalid directory: {directory}")
             
     def is_allowed_file(self, filename: str) -> bool:
         """检查文件类型是否允许"""
-        return Path(filename).suffix.lower() in self.ALLOWED_EXTENSIONS
+        _, dot, ext = filename.rpartition('.')
+        return bool(dot) and ext.lower() in self.ALLOWED_EXTENSIONS
         
     def check_file_size(self, size: int) -> bool:
         """检查文件大小是否允许"""
@@ -1,13 +1,37 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, desc
 from datetime import datetime, timedelta
+import time
 
 from .models import TrafficRecord, APIEndpoint, FilterRule
 
+# 键集分页游标: (created_at, id)
+Cursor = Tuple[datetime, str]
+
+def _seek_page(query, cursor: Optional[Cursor], limit: int) -> List[TrafficRecord]:
+    """按(created_at, id)倒序取一页，cursor为上一页最后一条记录的键"""
+    if cursor is not None:
+        created_at, record_id = cursor
+        query = query.filter(or_(
+            TrafficRecord.created_at < created_at,
+            and_(TrafficRecord.created_at == created_at, TrafficRecord.id < record_id)
+        ))
+    return query.order_by(desc(TrafficRecord.created_at), desc(TrafficRecord.id))\
+        .limit(limit)\
+        .all()
+
 class TrafficRecordCRUD:
     """流量记录数据访问层"""
     
+    @staticmethod
+    def next_cursor(records: List[TrafficRecord]) -> Optional[Cursor]:
+        """根据当前页最后一条记录生成下一页游标"""
+        if not records:
+            return None
+        last = records[-1]
+        return (last.created_at, last.id)
+    
     @staticmethod
     def create(db: Session, record: Dict[str, Any]) -> TrafficRecord:
         """创建流量记录"""
@@ -23,24 +47,26 @@ class TrafficRecordCRUD:
         return db.query(TrafficRecord).filter(TrafficRecord.id == record_id).first()
         
     @staticmethod
-    def get_by_service(db: Session, service_name: str, skip: int = 0, limit: int = 100) -> List[TrafficRecord]:
+    def get_by_service(
+        db: Session,
+        service_name: str,
+        cursor: Optional[Cursor] = None,
+        limit: int = 100
+    ) -> List[TrafficRecord]:
         """获取指定服务的流量记录"""
-        return db.query(TrafficRecord)\
-            .filter(TrafficRecord.service_name == service_name)\
-            .order_by(desc(TrafficRecord.created_at))\
-            .offset(skip)\
-            .limit(limit)\
-            .all()
+        query = db.query(TrafficRecord).filter(TrafficRecord.service_name == service_name)
+        return _seek_page(query, cursor, limit)
             
     @staticmethod
-    def get_by_api_path(db: Session, api_path: str, skip: int = 0, limit: int = 100) -> List[TrafficRecord]:
+    def get_by_api_path(
+        db: Session,
+        api_path: str,
+        cursor: Optional[Cursor] = None,
+        limit: int = 100
+    ) -> List[TrafficRecord]:
         """获取指定API路径的流量记录"""
-        return db.query(TrafficRecord)\
-            .filter(TrafficRecord.api_path == api_path)\
-            .order_by(desc(TrafficRecord.created_at))\
-            .offset(skip)\
-            .limit(limit)\
-            .all()
+        query = db.query(TrafficRecord).filter(TrafficRecord.api_path == api_path)
+        return _seek_page(query, cursor, limit)
             
     @staticmethod
     def search(
@@ -50,7 +76,7 @@ class TrafficRecordCRUD:
         method: Optional[str] = None,
         start_time: Optional[datetime] = None,
         end_time: Optional[datetime] = None,
-        skip: int = 0,
+        cursor: Optional[Cursor] = None,
         limit: int = 100
     ) -> List[TrafficRecord]:
         """搜索流量记录"""
@@ -67,7 +93,7 @@ class TrafficRecordCRUD:
         if end_time:
             query = query.filter(TrafficRecord.created_at <= end_time)
             
-        return query.order_by(desc(TrafficRecord.created_at)).offset(skip).limit(limit).all()
+        return _seek_page(query, cursor, limit)
 
 class APIEndpointCRUD:
     """API端点数据访问层"""
@@ -109,6 +135,15 @@ class APIEndpointCRUD:
             db.refresh(db_endpoint)
         return db_endpoint
 
+# 激活规则缓存：(加载时间, 版本号, 规则字段字典)；规则变更时递增版本号
+ACTIVE_RULES_TTL = 30.0
+_active_rules_rev = 0
+_active_rules_cache: Optional[Tuple[float, int, Tuple[Dict[str, Any], ...]]] = None
+
+def _invalidate_active_rules():
+    global _active_rules_rev
+    _active_rules_rev += 1
+
 class FilterRuleCRUD:
     """过滤规则数据访问层"""
     
@@ -119,6 +154,7 @@ class FilterRuleCRUD:
         db.add(db_rule)
         db.commit()
         db.refresh(db_rule)
+        _invalidate_active_rules()
         return db_rule
         
     @staticmethod
@@ -127,9 +163,20 @@ class FilterRuleCRUD:
         return db.query(FilterRule).filter(FilterRule.id == rule_id).first()
         
     @staticmethod
-    def get_active_rules(db: Session) -> List[FilterRule]:
-        """获取所有激活的过滤规则"""
-        return db.query(FilterRule).filter(FilterRule.is_active == True).all()
+    def get_active_rules(db: Session) -> List[Dict[str, Any]]:
+        """获取所有激活的过滤规则，结果在TTL内且规则未变更时直接复用
+        
+        缓存与会话无关的字段字典而不是ORM实例，每次返回副本。
+        """
+        global _active_rules_cache
+        cached = _active_rules_cache
+        if (cached is None or cached[1] != _active_rules_rev
+                or time.monotonic() - cached[0] >= ACTIVE_RULES_TTL):
+            rev = _active_rules_rev
+            rows = db.query(*FilterRule.__table__.columns).filter(FilterRule.is_active == True).all()
+            cached = (time.monotonic(), rev, tuple(dict(row._mapping) for row in rows))
+            _active_rules_cache = cached
+        return [dict(rule) for rule in cached[2]]
         
     @staticmethod
     def update(db: Session, rule_id: str, update_data: Dict[str, Any]) -> Optional[FilterRule]:
@@ -140,6 +187,7 @@ class FilterRuleCRUD:
                 setattr(db_rule, key, value)
             db.commit()
             db.refresh(db_rule)
+            _invalidate_active_rules()
         return db_rule
         
     @staticmethod
@@ -149,5 +197,6 @@ class FilterRuleCRUD:
         if db_rule:
             db.delete(db_rule)
             db.commit()
+            _invalidate_active_rules()
             return True
         return False 
\ No newline at end of file
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool, StaticPool
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.ext.declarative import declarative_base
 from contextlib import contextmanager
@@ -8,22 +9,51 @@ import os
 
 from .models import Base
 
+# SQLite同一时刻只允许一个写入者，连接池保持较小；服务端数据库使用较大的连接池
+SQLITE_POOL = {"pool_size": 5, "max_overflow": 5}
+SERVER_POOL = {"pool_size": 20, "max_overflow": 40}
+# 写锁被占用时等待的毫秒数，超时后才报database is locked
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+def _set_sqlite_pragma(dbapi_conn, _):
+    """新连接启用WAL：写入不阻塞读取，同步级别降为NORMAL"""
+    cursor = dbapi_conn.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
 class Database:
     def __init__(self, url: str = None):
         if url is None:
             url = os.getenv("DATABASE_URL", "sqlite:///./proxy.db")
             
+        is_sqlite = url.startswith("sqlite")
+        if not is_sqlite:
+            pool_args = {"poolclass": QueuePool, "pool_timeout": 30, **SERVER_POOL}
+        elif url in ("sqlite://", "sqlite:///:memory:"):
+            # 内存库每个连接都是独立的数据库，所有会话共用同一个连接
+            pool_args = {"poolclass": StaticPool}
+        else:
+            # SQLite文件库默认使用NullPool，显式指定较小的连接池
+            pool_args = {"poolclass": QueuePool, "pool_timeout": 30, **SQLITE_POOL}
         self.engine = create_engine(
             url,
             echo=False,  # 设置为True可以查看SQL语句
-            pool_size=5,
-            max_overflow=10,
-            pool_timeout=30,
+            # 允许跨线程使用SQLite连接
+            connect_args={"check_same_thread": False} if is_sqlite else {},
+            **pool_args
         )
+        if is_sqlite:
+            event.listen(self.engine, "connect", _set_sqlite_pragma)
         
+        # 提交后不使对象过期，避免返回结果时再次查询数据库
         self.SessionLocal = sessionmaker(
             autocommit=False,
             autoflush=False,
+            expire_on_commit=False,
             bind=self.engine
         )
         
@@ -54,5 +84,12 @@ db = Database()
 
 # 获取数据库会话的依赖函数
 def get_db():
-    with db.get_session() as session:
-        yield session 
\ No newline at end of file
+    session = db.SessionLocal()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close() 
\ No newline at end of file
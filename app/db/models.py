@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Text, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -12,8 +12,8 @@ class TrafficRecord(Base):
     __tablename__ = 'traffic_records'
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    service_name = Column(String(255), nullable=False, index=True)
-    api_path = Column(String(255), nullable=False, index=True)
+    service_name = Column(String(255), nullable=False)
+    api_path = Column(String(255), nullable=False)
     method = Column(String(10), nullable=False)
     url = Column(String(2048), nullable=False)
     request_headers = Column(JSON)
@@ -24,6 +24,14 @@ class TrafficRecord(Base):
     response_body = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # 联合索引：等值过滤列在前，排序列created_at在最后，查询可直接按索引顺序取数据
+        Index('ix_traffic_svc_created', 'service_name', 'created_at'),
+        Index('ix_traffic_path_created', 'api_path', 'created_at'),
+        Index('ix_traffic_svc_path_method_created', 'service_name', 'api_path', 'method', 'created_at'),
+        Index('ix_traffic_created', 'created_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -69,4 +77,14 @@ class FilterRule(Base):
     description = Column(Text)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # 部分索引：只索引激活的规则
+        Index(
+            'ix_filter_rules_active',
+            'filter_type',
+            sqlite_where=is_active == True,
+            postgresql_where=is_active == True
+        ),
+    ) 
\ No newline at end of file
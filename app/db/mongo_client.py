@@ -1,18 +1,53 @@
-from typing import Optional
+from typing import Optional, Set
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 import logging
 from urllib.parse import quote_plus
 import os
 
+def _available_compressors() -> str:
+    """按优先级返回可用的网络压缩算法，zlib来自标准库始终可用"""
+    compressors = []
+    for name, module in (("zstd", "zstandard"), ("snappy", "snappy")):
+        try:
+            __import__(module)
+            compressors.append(name)
+        except ImportError:
+            pass
+    compressors.append("zlib")
+    return ",".join(compressors)
+
+# (集合, 索引键, create_index参数)
+_INDEXES = [
+    # 流量记录集合索引：按API过滤并按时间倒序分页
+    ("traffic_records", [("host", 1), ("path", 1), ("method", 1), ("created_at", -1)], {}),
+    ("traffic_records", [("created_at", -1)], {}),
+    # 响应聚合按(host, path, method, response_status)分组
+    ("traffic_records", [("host", 1), ("path", 1), ("method", 1), ("response_status", 1)], {}),
+    # API端点集合索引
+    ("api_endpoints", [("host", 1), ("path", 1), ("method", 1)], {"unique": True}),
+    # 测试用例集合索引
+    ("test_cases", [("api_endpoint_id", 1), ("created_at", -1)], {}),
+    ("test_cases", [("created_at", -1)], {}),
+    # 测试结果集合索引：按用例过滤并按时间倒序分页
+    ("test_results", [("test_case_id", 1), ("created_at", -1)], {}),
+    # 过滤规则集合索引：同一类型下的规则不允许重复
+    ("filter_rules", [("pattern", 1), ("type", 1)], {"unique": True}),
+    # Host规则集合索引：域名唯一
+    ("host_rules", [("host", 1)], {"unique": True}),
+]
+
 class MongoManager:
     """MongoDB连接管理器"""
     
     def __init__(self):
         self.client: Optional[AsyncIOMotorClient] = None
         self.db: Optional[AsyncIOMotorDatabase] = None
+        self.created_indexes: Set[str] = set()  # 已成功创建的索引，"集合.索引名"
         
     async def connect(self):
-        """连接到MongoDB"""
+        """连接到MongoDB，整个进程只创建一个客户端"""
+        if self.client is not None:
+            return
         try:
             # 从环境变量获取配置
             username = os.getenv('MONGO_USERNAME', '')
@@ -27,11 +62,16 @@ class MongoManager:
             else:
                 uri = f"mongodb://{host}:{port}"
                 
-            # 创建连接
+            # 创建连接：连接池上限决定并发请求数，等待空闲连接超过2秒直接报错；
+            # 开启网络压缩，减少大请求/响应体的传输量
             self.client = AsyncIOMotorClient(
                 uri,
-                maxPoolSize=10,
-                minPoolSize=1,
+                maxPoolSize=int(os.getenv('MONGO_MAX_POOL_SIZE', '64')),
+                minPoolSize=int(os.getenv('MONGO_MIN_POOL_SIZE', '16')),
+                waitQueueTimeoutMS=2000,
+                maxIdleTimeMS=60000,
+                retryWrites=True,
+                compressors=_available_compressors(),
                 serverSelectionTimeoutMS=5000
             )
             
@@ -58,39 +98,36 @@ class MongoManager:
             await self.connect()
         return self.db
         
+    def has_index(self, collection: str, name: str) -> bool:
+        """索引是否已由init_indexes成功创建"""
+        return f"{collection}.{name}" in self.created_indexes
+        
     async def init_indexes(self):
-        """初始化索引"""
-        try:
-            db = await self.get_database()
-            
-            # 流量记录集合索引
-            await db.traffic_records.create_index([
-                ("host", 1),
-                ("path", 1),
-                ("method", 1)
-            ])
-            await db.traffic_records.create_index([("created_at", -1)])
-            
-            # API端点集合索引
-            await db.api_endpoints.create_index([
-                ("host", 1),
-                ("path", 1),
-                ("method", 1)
-            ], unique=True)
-            
-            # 测试用例集合索引
-            await db.test_cases.create_index([("api_endpoint_id", 1)])
-            await db.test_cases.create_index([("created_at", -1)])
-            
-            logging.info("MongoDB indexes initialized")
-            
-        except Exception as e:
-            logging.error(f"Failed to initialize MongoDB indexes: {e}")
-            raise
+        """初始化索引
+
+        每个索引单独创建，某个索引失败（如已有重复数据无法建唯一索引）
+        不影响其余索引；全部尝试后如有失败再统一抛出。
+        """
+        db = await self.get_database()
+        failed = []
+        for collection, keys, options in _INDEXES:
+            try:
+                name = await db[collection].create_index(keys, **options)
+                self.created_indexes.add(f"{collection}.{name}")
+            except Exception as e:
+                logging.error(f"Failed to create index {collection} {keys}: {e}")
+                failed.append(collection)
+        if failed:
+            raise RuntimeError(f"Failed to initialize MongoDB indexes on: {', '.join(failed)}")
+        logging.info("MongoDB indexes initialized")
 
 # 创建全局MongoDB管理器实例
 mongo_manager = MongoManager() 
 
 # 提供顶层 get_database 方法，便于依赖注入和外部调用
-async def get_database():
+# 保持async：FastAPI会把同步依赖放到线程池执行，反而更慢；已连接时直接返回不会挂起
+async def get_database() -> AsyncIOMotorDatabase:
+    db = mongo_manager.db
+    if db is not None:
+        return db
     return await mongo_manager.get_database() 
\ No newline at end of file
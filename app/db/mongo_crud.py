@@ -1,7 +1,14 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Union
+from functools import lru_cache
+import asyncio
+import logging
 from datetime import datetime
 from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+import orjson
 
 from ..models.mongo_models import (
     TrafficRecord,
@@ -11,8 +18,149 @@ from ..models.mongo_models import (
     TestSuite
 )
 
+@lru_cache(maxsize=4096)
+def _parse_oid(value: str) -> ObjectId:
+    return ObjectId(value)
+
+def _to_oid(value: Union[str, ObjectId]) -> ObjectId:
+    """转换为ObjectId：已是ObjectId时直接返回，字符串解析结果会被缓存"""
+    if isinstance(value, ObjectId):
+        return value
+    return _parse_oid(value)
+
+# metadata集合中记录traffic_records版本号的文档ID
+TRAFFIC_VERSION_ID = "traffic_version"
+
+async def get_records_version(db: AsyncIOMotorDatabase) -> int:
+    """获取traffic_records的当前版本号"""
+    doc = await db.metadata.find_one({"_id": TRAFFIC_VERSION_ID})
+    return doc["v"] if doc else 0
+
+async def bump_records_version(db: AsyncIOMotorDatabase):
+    """traffic_records写入后递增版本号，使聚合缓存失效"""
+    await db.metadata.update_one(
+        {"_id": TRAFFIC_VERSION_ID},
+        {"$inc": {"v": 1}},
+        upsert=True
+    )
+
+class EndpointCounter:
+    """API端点流量计数器
+    
+    写入流量记录时只在内存中累加(host, path, method)的计数，后台任务定期
+    把自上次刷新以来的增量合并为一次bulk_write写入api_endpoints。
+    """
+    
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._counts: Dict[tuple, list] = {}  # (host, path, method) -> [计数, 最后出现时间]
+        self._task: Optional[asyncio.Task] = None
+        
+    @property
+    def running(self) -> bool:
+        """后台刷新任务是否在当前事件循环中运行"""
+        if self._task is None or self._task.done():
+            return False
+        try:
+            return self._task.get_loop() is asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+            
+    def add(self, host: str, path: str, method: str, n: int = 1, last_seen: Optional[datetime] = None):
+        """累加端点计数"""
+        last_seen = last_seen or datetime.utcnow()
+        entry = self._counts.get((host, path, method))
+        if entry is None:
+            self._counts[(host, path, method)] = [n, last_seen]
+        else:
+            entry[0] += n
+            entry[1] = max(entry[1], last_seen)
+            
+    async def flush(self, db: AsyncIOMotorDatabase):
+        """将累计的增量写入数据库"""
+        # 整体替换计数表，替换与后续写入之间不会有其他协程插入
+        counts, self._counts = self._counts, {}
+        if not counts:
+            return
+        try:
+            await db.api_endpoints.bulk_write([
+                UpdateOne(
+                    {"host": host, "path": path, "method": method},
+                    {
+                        "$inc": {"traffic_count": n},
+                        "$max": {"last_seen": last_seen}
+                    },
+                    upsert=True
+                )
+                for (host, path, method), (n, last_seen) in counts.items()
+            ], ordered=False)
+        except Exception:
+            # 写入失败时把增量合并回去，下次刷新重试
+            for (host, path, method), (n, last_seen) in counts.items():
+                self.add(host, path, method, n, last_seen)
+            raise
+            
+    async def _run(self, db: AsyncIOMotorDatabase):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush(db)
+            except Exception as e:
+                logging.error(f"Failed to flush endpoint counters: {e}")
+                
+    def start(self, db: AsyncIOMotorDatabase):
+        """启动后台刷新任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(db))
+            
+    async def stop(self, db: AsyncIOMotorDatabase):
+        """停止后台任务并写入剩余增量"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(db)
+
+# 全局端点计数器
+endpoint_counter = EndpointCounter()
+
+# 超过该大小的请求/响应体存入GridFS，记录中只保存文件ID(<字段>_ref)
+BODY_INLINE_LIMIT = 64 * 1024
+BODY_BUCKET = "traffic_bodies"
+_BODY_FIELDS = ("request_body", "response_body")
+
+def _encode_body(body: Any) -> Tuple[bytes, str]:
+    """将请求/响应体编码为字节，返回(数据, 类型)"""
+    if isinstance(body, bytes):
+        return body, "bytes"
+    if isinstance(body, str):
+        return body.encode("utf-8"), "text"
+    return orjson.dumps(body), "json"
+
+def _decode_body(data: bytes, kind: str) -> Any:
+    if kind == "json":
+        return orjson.loads(data)
+    if kind == "text":
+        return data.decode("utf-8")
+    return data
+
+# 抓包记录可容忍极少量丢失，写入只需主节点确认、不等待journal；
+# 测试用例/结果/套件仍使用默认写关注
+INGEST_WRITE_CONCERN = WriteConcern(w=1, j=False)
+
+# 列表查询不返回体积大的请求/响应体，需要完整记录时用get_by_id
+TRAFFIC_LIST_PROJECTION = {"request_body": 0, "response_body": 0}
+ENDPOINT_LIST_PROJECTION = {"example_request": 0, "example_response": 0}
+
 class MongoDAO:
-    """MongoDB数据访问对象基类"""
+    """MongoDB数据访问对象基类
+
+    列表查询返回的文档由本系统写入，已符合模型结构，
+    使用construct()构建模型以跳过逐字段校验。
+    """
     
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
@@ -21,49 +169,130 @@ class TrafficRecordDAO(MongoDAO):
     """流量记录数据访问对象"""
     
     async def create(self, record: TrafficRecord) -> str:
-        """创建流量记录"""
-        result = await self.db.traffic_records.insert_one(record.dict(by_alias=True))
+        """创建流量记录
         
-        # 更新API端点统计
-        await self.db.api_endpoints.update_one(
-            {
-                "host": record.host,
-                "path": record.path,
-                "method": record.method
-            },
-            {
-                "$inc": {"traffic_count": 1},
-                "$set": {"last_seen": datetime.utcnow()}
-            },
-            upsert=True
-        )
+        写入器运行时记录进入批量写入队列，与其他并发写入合并为一次批量操作，
+        批次提交后返回；否则直接写入。
+        """
+        from .writer import mongo_traffic_writer
+        if not mongo_traffic_writer.running:
+            await self.create_many([record])
+            return str(record.id)
+        future = asyncio.get_running_loop().create_future()
+        await mongo_traffic_writer.put((record, future))
+        return await future
         
-        return str(result.inserted_id)
+    async def create_many(self, records: List[TrafficRecord]) -> int:
+        """批量创建流量记录，返回插入条数"""
+        return await self.create_many_raw([r.dict(by_alias=True) for r in records])
+        
+    async def create_raw(self, doc: Dict[str, Any]) -> str:
+        """直接写入字典形式的流量记录，跳过模型校验"""
+        await self.create_many_raw([doc])
+        return str(doc["_id"])
+        
+    async def create_many_raw(self, docs: List[Dict[str, Any]]) -> int:
+        """批量写入字典形式的流量记录，跳过模型校验，返回插入条数
+        
+        用于解析器产出的可信数据，缺少的_id和时间戳在这里补齐。
+        """
+        if not docs:
+            return 0
+        now = datetime.utcnow()
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+            doc.setdefault("created_at", now)
+            doc.setdefault("updated_at", now)
+        await self._offload_bodies(docs)
+        records = self.db.traffic_records.with_options(write_concern=INGEST_WRITE_CONCERN)
+        result = await records.insert_many(docs, ordered=False)
+        
+        # API端点统计先在内存中累加，由后台任务定期批量写入
+        for doc in docs:
+            endpoint_counter.add(doc["host"], doc["path"], doc["method"], 1, now)
+        if not endpoint_counter.running:
+            await endpoint_counter.flush(self.db)
+        await bump_records_version(self.db)
+        
+        return len(result.inserted_ids)
+        
+    async def _offload_bodies(self, docs: List[Dict[str, Any]]):
+        """把超过BODY_INLINE_LIMIT的请求/响应体转存到GridFS"""
+        bucket = None
+        for doc in docs:
+            for field in _BODY_FIELDS:
+                body = doc.get(field)
+                if body is None:
+                    continue
+                # UTF-8每个字符最多4字节，短字符串无需编码即可判定
+                if isinstance(body, str) and len(body) * 4 <= BODY_INLINE_LIMIT:
+                    continue
+                try:
+                    data, kind = _encode_body(body)
+                except TypeError:
+                    continue
+                if len(data) <= BODY_INLINE_LIMIT:
+                    continue
+                if bucket is None:
+                    bucket = AsyncIOMotorGridFSBucket(self.db, bucket_name=BODY_BUCKET)
+                doc[f"{field}_ref"] = await bucket.upload_from_stream(
+                    f"{doc['_id']}_{field}", data, metadata={"kind": kind}
+                )
+                doc[field] = None
+                
+    async def get_body(self, record_id: Union[str, ObjectId], field: str = "response_body") -> Any:
+        """获取请求/响应体，存放在GridFS中时按需读取"""
+        if field not in _BODY_FIELDS:
+            raise ValueError(f"Invalid body field: {field}")
+        ref_field = f"{field}_ref"
+        doc = await self.db.traffic_records.find_one(
+            {"_id": _to_oid(record_id)}, {field: 1, ref_field: 1}
+        )
+        if not doc:
+            return None
+        file_id = doc.get(ref_field)
+        if file_id is None:
+            return doc.get(field)
+        bucket = AsyncIOMotorGridFSBucket(self.db, bucket_name=BODY_BUCKET)
+        stream = await bucket.open_download_stream(file_id)
+        data = await stream.read()
+        return _decode_body(data, (stream.metadata or {}).get("kind", "bytes"))
         
-    async def get_by_id(self, record_id: str) -> Optional[TrafficRecord]:
-        """根据ID获取流量记录"""
-        record = await self.db.traffic_records.find_one({"_id": ObjectId(record_id)})
+    async def get_by_id(self, record_id: Union[str, ObjectId]) -> Optional[TrafficRecord]:
+        """根据ID获取流量记录（超大的请求/响应体只返回GridFS文件ID）"""
+        record = await self.db.traffic_records.find_one({"_id": _to_oid(record_id)})
         return TrafficRecord(**record) if record else None
         
     async def get_by_api(self, host: str, path: str, method: str, 
                         skip: int = 0, limit: int = 20) -> List[TrafficRecord]:
-        """获取指定API的流量记录"""
+        """获取指定API的流量记录（不含请求/响应体）"""
         cursor = self.db.traffic_records.find({
             "host": host,
             "path": path,
             "method": method
-        }).sort("created_at", -1).skip(skip).limit(limit)
+        }, TRAFFIC_LIST_PROJECTION).sort("created_at", -1).skip(skip).limit(limit).batch_size(limit)
         
-        return [TrafficRecord(**doc) async for doc in cursor]
+        docs = await cursor.to_list(length=limit)
+        return [TrafficRecord.construct(**doc) for doc in docs]
         
     async def search(self, query: Dict[str, Any], 
                     skip: int = 0, limit: int = 20) -> List[TrafficRecord]:
-        """搜索流量记录"""
-        cursor = self.db.traffic_records.find(query).sort(
+        """搜索流量记录（不含请求/响应体）"""
+        cursor = self.db.traffic_records.find(query, TRAFFIC_LIST_PROJECTION).sort(
             "created_at", -1
-        ).skip(skip).limit(limit)
+        ).skip(skip).limit(limit).batch_size(limit)
         
-        return [TrafficRecord(**doc) async for doc in cursor]
+        docs = await cursor.to_list(length=limit)
+        return [TrafficRecord.construct(**doc) for doc in docs]
+        
+    async def search_fields(self, query: Dict[str, Any], fields: List[str],
+                           skip: int = 0, limit: int = 20) -> List[Dict[str, Any]]:
+        """搜索流量记录，只返回指定字段的原始文档"""
+        cursor = self.db.traffic_records.find(
+            query, {field: 1 for field in fields}
+        ).sort("created_at", -1).skip(skip).limit(limit).batch_size(limit)
+        
+        return await cursor.to_list(length=limit)
 
 class APIEndpointDAO(MongoDAO):
     """API端点数据访问对象"""
@@ -73,9 +302,9 @@ class APIEndpointDAO(MongoDAO):
         result = await self.db.api_endpoints.insert_one(endpoint.dict(by_alias=True))
         return str(result.inserted_id)
         
-    async def get_by_id(self, endpoint_id: str) -> Optional[APIEndpoint]:
+    async def get_by_id(self, endpoint_id: Union[str, ObjectId]) -> Optional[APIEndpoint]:
         """根据ID获取API端点"""
-        endpoint = await self.db.api_endpoints.find_one({"_id": ObjectId(endpoint_id)})
+        endpoint = await self.db.api_endpoints.find_one({"_id": _to_oid(endpoint_id)})
         return APIEndpoint(**endpoint) if endpoint else None
         
     async def get_by_path(self, host: str, path: str, method: str) -> Optional[APIEndpoint]:
@@ -87,22 +316,23 @@ class APIEndpointDAO(MongoDAO):
         })
         return APIEndpoint(**endpoint) if endpoint else None
         
-    async def update(self, endpoint_id: str, update_data: Dict) -> bool:
+    async def update(self, endpoint_id: Union[str, ObjectId], update_data: Dict) -> bool:
         """更新API端点"""
         update_data["updated_at"] = datetime.utcnow()
         result = await self.db.api_endpoints.update_one(
-            {"_id": ObjectId(endpoint_id)},
+            {"_id": _to_oid(endpoint_id)},
             {"$set": update_data}
         )
         return result.modified_count > 0
         
     async def list_all(self, skip: int = 0, limit: int = 20) -> List[APIEndpoint]:
-        """列出所有API端点"""
-        cursor = self.db.api_endpoints.find().sort(
+        """列出所有API端点（不含请求/响应示例）"""
+        cursor = self.db.api_endpoints.find({}, ENDPOINT_LIST_PROJECTION).sort(
             "last_seen", -1
-        ).skip(skip).limit(limit)
+        ).skip(skip).limit(limit).batch_size(limit)
         
-        return [APIEndpoint(**doc) async for doc in cursor]
+        docs = await cursor.to_list(length=limit)
+        return [APIEndpoint.construct(**doc) for doc in docs]
 
 class TestCaseDAO(MongoDAO):
     """测试用例数据访问对象"""
@@ -112,32 +342,33 @@ class TestCaseDAO(MongoDAO):
         result = await self.db.test_cases.insert_one(test_case.dict(by_alias=True))
         return str(result.inserted_id)
         
-    async def get_by_id(self, case_id: str) -> Optional[TestCase]:
+    async def get_by_id(self, case_id: Union[str, ObjectId]) -> Optional[TestCase]:
         """根据ID获取测试用例"""
-        case = await self.db.test_cases.find_one({"_id": ObjectId(case_id)})
+        case = await self.db.test_cases.find_one({"_id": _to_oid(case_id)})
         return TestCase(**case) if case else None
         
-    async def update(self, case_id: str, update_data: Dict) -> bool:
+    async def update(self, case_id: Union[str, ObjectId], update_data: Dict) -> bool:
         """更新测试用例"""
         update_data["updated_at"] = datetime.utcnow()
         result = await self.db.test_cases.update_one(
-            {"_id": ObjectId(case_id)},
+            {"_id": _to_oid(case_id)},
             {"$set": update_data}
         )
         return result.modified_count > 0
         
-    async def delete(self, case_id: str) -> bool:
+    async def delete(self, case_id: Union[str, ObjectId]) -> bool:
         """删除测试用例"""
-        result = await self.db.test_cases.delete_one({"_id": ObjectId(case_id)})
+        result = await self.db.test_cases.delete_one({"_id": _to_oid(case_id)})
         return result.deleted_count > 0
         
-    async def list_by_api(self, api_endpoint_id: str) -> List[TestCase]:
+    async def list_by_api(self, api_endpoint_id: Union[str, ObjectId]) -> List[TestCase]:
         """列出API端点的所有测试用例"""
         cursor = self.db.test_cases.find({
-            "api_endpoint_id": ObjectId(api_endpoint_id)
+            "api_endpoint_id": _to_oid(api_endpoint_id)
         }).sort("created_at", -1)
         
-        return [TestCase(**doc) async for doc in cursor]
+        docs = await cursor.to_list(length=None)
+        return [TestCase.construct(**doc) for doc in docs]
 
 class TestResultDAO(MongoDAO):
     """测试结果数据访问对象"""
@@ -150,28 +381,74 @@ class TestResultDAO(MongoDAO):
         # 插入结果
         await self.db.test_results.insert_one(result_dict)
         
-        # 更新测试用例状态
+        # 更新测试用例状态：只保存结果摘要和结果ID，完整结果按ID到test_results查询
         await self.db.test_cases.update_one(
             {"_id": result.test_case_id},
             {
                 "$set": {
                     "status": result.status,
-                    "last_run": result.created_at,
-                    "last_result": result_dict
-                }
+                    "last_run": result_dict["created_at"],
+                    "last_result_id": result_dict["_id"]
+                },
+                "$unset": {"last_result": ""}
             }
         )
         
         return str(result_dict["_id"])
         
-    async def get_by_case(self, case_id: str, 
+    async def bulk_create(self, results: List[TestResult]) -> List[str]:
+        """批量创建测试结果（如测试套件运行结束后一次性写入）
+        
+        先批量插入结果，再对插入成功的结果批量更新测试用例状态；
+        同一用例有多条结果时以列表中最后一条为准。部分插入失败时
+        更新成功部分对应的用例后重新抛出BulkWriteError。
+        """
+        if not results:
+            return []
+        now = datetime.utcnow()
+        docs = []
+        updates = []
+        for result in results:
+            result_dict = result.dict(by_alias=True)
+            result_dict["created_at"] = now
+            docs.append(result_dict)
+            updates.append(UpdateOne(
+                {"_id": result.test_case_id},
+                {
+                    "$set": {
+                        "status": result.status,
+                        "last_run": now,
+                        "last_result_id": result_dict["_id"]
+                    },
+                    "$unset": {"last_result": ""}
+                }
+            ))
+        
+        try:
+            await self.db.test_results.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"] for err in e.details.get("writeErrors", [])}
+            inserted = [u for i, u in enumerate(updates) if i not in failed]
+            if inserted:
+                await self.db.test_cases.bulk_write(inserted, ordered=True)
+            raise
+        await self.db.test_cases.bulk_write(updates, ordered=True)
+        return [str(doc["_id"]) for doc in docs]
+        
+    async def get_by_id(self, result_id: Union[str, ObjectId]) -> Optional[TestResult]:
+        """根据ID获取测试结果，配合TestCase.last_result_id使用"""
+        result = await self.db.test_results.find_one({"_id": _to_oid(result_id)})
+        return TestResult(**result) if result else None
+        
+    async def get_by_case(self, case_id: Union[str, ObjectId], 
                          skip: int = 0, limit: int = 20) -> List[TestResult]:
         """获取测试用例的所有结果"""
         cursor = self.db.test_results.find({
-            "test_case_id": ObjectId(case_id)
-        }).sort("created_at", -1).skip(skip).limit(limit)
+            "test_case_id": _to_oid(case_id)
+        }).sort("created_at", -1).skip(skip).limit(limit).batch_size(limit)
         
-        return [TestResult(**doc) async for doc in cursor]
+        docs = await cursor.to_list(length=limit)
+        return [TestResult.construct(**doc) for doc in docs]
 
 class TestSuiteDAO(MongoDAO):
     """测试套件数据访问对象"""
@@ -181,29 +458,30 @@ class TestSuiteDAO(MongoDAO):
         result = await self.db.test_suites.insert_one(suite.dict(by_alias=True))
         return str(result.inserted_id)
         
-    async def get_by_id(self, suite_id: str) -> Optional[TestSuite]:
+    async def get_by_id(self, suite_id: Union[str, ObjectId]) -> Optional[TestSuite]:
         """根据ID获取测试套件"""
-        suite = await self.db.test_suites.find_one({"_id": ObjectId(suite_id)})
+        suite = await self.db.test_suites.find_one({"_id": _to_oid(suite_id)})
         return TestSuite(**suite) if suite else None
         
-    async def update(self, suite_id: str, update_data: Dict) -> bool:
+    async def update(self, suite_id: Union[str, ObjectId], update_data: Dict) -> bool:
         """更新测试套件"""
         update_data["updated_at"] = datetime.utcnow()
         result = await self.db.test_suites.update_one(
-            {"_id": ObjectId(suite_id)},
+            {"_id": _to_oid(suite_id)},
             {"$set": update_data}
         )
         return result.modified_count > 0
         
-    async def delete(self, suite_id: str) -> bool:
+    async def delete(self, suite_id: Union[str, ObjectId]) -> bool:
         """删除测试套件"""
-        result = await self.db.test_suites.delete_one({"_id": ObjectId(suite_id)})
+        result = await self.db.test_suites.delete_one({"_id": _to_oid(suite_id)})
         return result.deleted_count > 0
         
     async def list_all(self, skip: int = 0, limit: int = 20) -> List[TestSuite]:
         """列出所有测试套件"""
         cursor = self.db.test_suites.find().sort(
             "created_at", -1
-        ).skip(skip).limit(limit)
+        ).skip(skip).limit(limit).batch_size(limit)
         
-        return [TestSuite(**doc) async for doc in cursor] 
\ No newline at end of file
+        docs = await cursor.to_list(length=limit)
+        return [TestSuite.construct(**doc) for doc in docs] 
\ No newline at end of file
@@ -0,0 +1,58 @@
+from typing import Any, Dict, List, Tuple
+import asyncio
+import sys
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from .mongo_client import mongo_manager
+
+# 查询计划审计（开发/CI使用）：对关键查询执行explain，检查获胜计划是否走索引
+# 用法: python -m app.db.plan_audit，存在COLLSCAN时以非零状态退出
+
+# (集合, 查询条件)，与路由和DAO中的查询保持一致
+AUDIT_QUERIES: List[Tuple[str, Dict[str, Any]]] = [
+    ("host_rules", {"host": "example.com"}),
+    ("host_rules", {"_id": ObjectId()}),
+    ("filter_rules", {"pattern": "example", "type": "url"}),
+    ("traffic_records", {"host": "example.com", "path": "/", "method": "GET"}),
+    ("api_endpoints", {"host": "example.com", "path": "/", "method": "GET"}),
+]
+
+def _collect_stages(plan: Dict[str, Any]) -> List[str]:
+    """递归收集执行计划中的所有阶段名"""
+    stages = [plan.get("stage")]
+    if "inputStage" in plan:
+        stages.extend(_collect_stages(plan["inputStage"]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_collect_stages(child))
+    return stages
+
+async def audit(db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
+    """对AUDIT_QUERIES逐一执行explain，返回每个查询的计划阶段"""
+    results = []
+    for collection, query in AUDIT_QUERIES:
+        explain = await db[collection].find(query).explain()
+        winning = explain["queryPlanner"]["winningPlan"]
+        # 新版本使用SBE引擎时计划嵌套在queryPlan中
+        stages = _collect_stages(winning.get("queryPlan", winning))
+        results.append({
+            "collection": collection,
+            "query": query,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return results
+
+async def main() -> int:
+    db = await mongo_manager.get_database()
+    await mongo_manager.init_indexes()
+    results = await audit(db)
+    for r in results:
+        flag = "COLLSCAN" if r["collscan"] else "ok"
+        print(f"[{flag}] {r['collection']} {r['query']}: {' <- '.join(map(str, r['stages']))}")
+    await mongo_manager.close()
+    return 1 if any(r["collscan"] for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
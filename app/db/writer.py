@@ -0,0 +1,141 @@
+from typing import Any, Awaitable, Callable, List, Optional
+import asyncio
+import logging
+
+from .mongo_client import get_database
+from .mongo_crud import TrafficRecordDAO
+
+QUEUE_MAXSIZE = 10000
+BATCH_SIZE = 500
+
+class BatchWriter:
+    """批量写入器：有界队列 + 单个后台任务
+
+    生产者通过put()入队，队列满时等待形成背压；后台任务每次取出
+    队列中已有的记录（最多batch_size条）交给flush批量写入。
+    linger>0时，取到第一条记录后最多再等待linger秒以凑满一批。
+    stop()不会打断正在进行的写入：已取出的批次先写完，再写入队列中剩余的记录。
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[Any]], Awaitable[Any]],
+        maxsize: int = QUEUE_MAXSIZE,
+        batch_size: int = BATCH_SIZE,
+        linger: float = 0.0
+    ):
+        self.flush = flush
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.linger = linger
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[List[Any]] = None  # 已取出、尚未写完的批次
+        self._flush_task: Optional[asyncio.Task] = None  # 正在进行的写入
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        # 延迟创建队列，确保绑定到运行中的事件循环
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        return self._queue
+
+    @property
+    def running(self) -> bool:
+        """后台任务是否在当前事件循环中运行"""
+        if self._task is None or self._task.done():
+            return False
+        try:
+            return self._task.get_loop() is asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+    async def put(self, item: Any):
+        """写入一条记录，队列满时等待"""
+        await self.queue.put(item)
+
+    def _drain(self, first: Any) -> List[Any]:
+        """取出队列中已有的记录组成一批"""
+        batch = [first]
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _write(self, batch: List[Any]):
+        try:
+            await self.flush(batch)
+        except Exception as e:
+            logging.error(f"Batch write failed ({len(batch)} records): {e}")
+
+    async def _linger(self, batch: List[Any]):
+        """在linger时间内继续收集记录，直到凑满一批或超时"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.linger
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        while True:
+            batch = self._drain(await self.queue.get())
+            self._inflight = batch
+            if self.linger > 0:
+                await self._linger(batch)
+            # 写入放在独立任务中并屏蔽取消，stop()时等待它完成
+            self._flush_task = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._flush_task)
+            self._flush_task = None
+            self._inflight = None
+
+    def start(self):
+        """启动后台写入任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务并写入队列中剩余的记录"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # 取消时正在写入的批次等待写完，仍在凑批的批次在这里写入
+        batch, self._inflight = self._inflight, None
+        flush_task, self._flush_task = self._flush_task, None
+        if flush_task is not None:
+            await flush_task
+        elif batch:
+            await self._write(batch)
+        while self._queue is not None and not self._queue.empty():
+            await self._write(self._drain(self._queue.get_nowait()))
+
+async def _flush_mongo_records(items: List[tuple]):
+    """批量写入MongoDB，并通知每条记录的等待方"""
+    records = [record for record, _ in items]
+    try:
+        db = await get_database()
+        await TrafficRecordDAO(db).create_many(records)
+    except Exception as e:
+        for _, future in items:
+            if not future.done():
+                future.set_exception(e)
+        raise
+    else:
+        for record, future in items:
+            if not future.done():
+                future.set_result(str(record.id))
+    finally:
+        # 写入被取消时同样通知等待方，避免create()永久挂起
+        for _, future in items:
+            if not future.done():
+                future.cancel()
+
+# 全局流量记录写入器（MongoDB存储），元素为(TrafficRecord, Future)
+mongo_traffic_writer = BatchWriter(_flush_mongo_records, batch_size=200, linger=0.005)
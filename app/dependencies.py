@@ -1,5 +1,5 @@
 from typing import AsyncGenerator
-from fastapi import Depends
+from fastapi import FastAPI, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from .db.mongo_client import mongo_manager
@@ -19,32 +19,31 @@ async def get_db() -> AsyncGenerator[AsyncIOMotorDatabase, None]:
     finally:
         pass  # 连接由mongo_manager管理
 
-async def get_traffic_dao(
-    db: AsyncIOMotorDatabase = Depends(get_db)
-) -> TrafficRecordDAO:
+def init_daos(app: FastAPI, db: AsyncIOMotorDatabase):
+    """应用启动时创建DAO单例，DAO只是对共享db的无状态封装"""
+    app.state.traffic_dao = TrafficRecordDAO(db)
+    app.state.api_dao = APIEndpointDAO(db)
+    app.state.testcase_dao = TestCaseDAO(db)
+    app.state.testresult_dao = TestResultDAO(db)
+    app.state.testsuite_dao = TestSuiteDAO(db)
+
+# 以下依赖保持async：同步依赖会被FastAPI放到线程池执行
+async def get_traffic_dao(request: Request) -> TrafficRecordDAO:
     """获取流量记录DAO"""
-    return TrafficRecordDAO(db)
+    return request.app.state.traffic_dao
 
-async def get_api_dao(
-    db: AsyncIOMotorDatabase = Depends(get_db)
-) -> APIEndpointDAO:
+async def get_api_dao(request: Request) -> APIEndpointDAO:
     """获取API端点DAO"""
-    return APIEndpointDAO(db)
+    return request.app.state.api_dao
 
-async def get_testcase_dao(
-    db: AsyncIOMotorDatabase = Depends(get_db)
-) -> TestCaseDAO:
+async def get_testcase_dao(request: Request) -> TestCaseDAO:
     """获取测试用例DAO"""
-    return TestCaseDAO(db)
+    return request.app.state.testcase_dao
 
-async def get_testresult_dao(
-    db: AsyncIOMotorDatabase = Depends(get_db)
-) -> TestResultDAO:
+async def get_testresult_dao(request: Request) -> TestResultDAO:
     """获取测试结果DAO"""
-    return TestResultDAO(db)
+    return request.app.state.testresult_dao
 
-async def get_testsuite_dao(
-    db: AsyncIOMotorDatabase = Depends(get_db)
-) -> TestSuiteDAO:
+async def get_testsuite_dao(request: Request) -> TestSuiteDAO:
     """获取测试套件DAO"""
-    return TestSuiteDAO(db) 
\ No newline at end of file
+    return request.app.state.testsuite_dao
@@ -1,20 +1,26 @@
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.api import proxy_routes, filter_routes, host_routes, file_routes
+from app.middleware.cors import BrowserCORSMiddleware
 from app.middleware.logging import RequestLoggingMiddleware
 from app.middleware.error_handler import ErrorHandlerMiddleware
-from app.utils.logger import logger_config
+from app.utils.logger import logger_config, error_logger
+from app.db.mongo_client import mongo_manager, get_database
+from app.db.writer import mongo_traffic_writer
+from app.db.mongo_crud import endpoint_counter
+from app.dependencies import init_daos
 
 # 初始化应用
 app = FastAPI(
     title="接口测试平台",
     description="接口测试抓取流量AI生成测试用例平台",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # 添加中间件
 app.add_middleware(
-    CORSMiddleware,
+    BrowserCORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
@@ -34,6 +40,25 @@ async def startup_event():
     """应用启动时的初始化操作"""
     # 确保日志目录存在
     logger_config.log_dir.mkdir(exist_ok=True)
+    # 连接MongoDB并初始化索引，数据库不可用时不影响应用启动
+    try:
+        await mongo_manager.connect()
+        await mongo_manager.init_indexes()
+    except Exception as e:
+        error_logger.error(f"MongoDB索引初始化失败: {e}")
+    init_daos(app, await get_database())
+    # 启动流量记录后台写入任务
+    mongo_traffic_writer.start()
+    endpoint_counter.start(await get_database())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时写入队列中剩余的流量记录"""
+    await mongo_traffic_writer.stop()
+    try:
+        await endpoint_counter.stop(await get_database())
+    except Exception as e:
+        error_logger.error(f"端点计数写入失败: {e}")
 
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,17 @@
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.types import Receive, Scope, Send
+
+class BrowserCORSMiddleware(CORSMiddleware):
+    """只处理带Origin头的请求的CORS中间件
+
+    代理上报、健康检查等非浏览器请求不带Origin头，直接交给下游应用，
+    省去Headers对象构造和CORS判断。
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and not any(
+            name == b"origin" for name, _ in scope["headers"]
+        ):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -1,24 +1,49 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from app.utils.errors import AppError, handle_error
 from app.utils.logger import error_logger
 
-class ErrorHandlerMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+class ErrorHandlerMiddleware:
+    """错误处理中间件
+
+    纯ASGI实现，将未处理的异常转换为JSON错误响应；
+    响应已经开始发送时无法再改写，异常继续向上抛出。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
         try:
-            return await call_next(request)
+            await self.app(scope, receive, send_wrapper)
         except AppError as e:
+            if response_started:
+                raise
             # 处理应用自定义错误
             http_exception = handle_error(e)
-            return JSONResponse(
+            response = ORJSONResponse(
                 status_code=http_exception.status_code,
                 content=http_exception.detail
             )
+            await response(scope, receive, send)
         except Exception as e:
+            if response_started:
+                raise
             # 处理未知错误
             error_logger.exception("Unhandled error occurred")
-            return JSONResponse(
+            response = ORJSONResponse(
                 status_code=500,
                 content={
                     "error_code": "INTERNAL_ERROR",
@@ -28,4 +53,5 @@ class ErrorHandlerMiddleware(BaseHTTPMiddleware):
                         "message": str(e)
                     }
                 }
-            ) 
\ No newline at end of file
+            )
+            await response(scope, receive, send)
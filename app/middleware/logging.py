@@ -1,44 +1,39 @@
 import time
 import uuid
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import Message
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from app.utils.logger import access_logger, error_logger
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        request_id = str(uuid.uuid4())
+class RequestLoggingMiddleware:
+    """请求日志中间件
+
+    纯ASGI实现，不经过BaseHTTPMiddleware的额外任务和队列；
+    为响应添加X-Request-ID头，只记录错误响应和异常。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = uuid.uuid4().hex
         start_time = time.time()
+        status_code = 500
 
         # 添加自定义响应头
         async def send_wrapper(message: Message):
+            nonlocal status_code
             if message["type"] == "http.response.start":
-                headers = message.get("headers", [])
-                headers.append(
-                    (b"X-Request-ID", str(request_id).encode())
-                )
-                message["headers"] = headers
-            await request.send(message)
+                status_code = message["status"]
+                MutableHeaders(scope=message).append("X-Request-ID", request_id)
+            await send(message)
 
         try:
-            response = await call_next(request)
-            
-            # 只记录错误响应
-            if response.status_code >= 400:
-                process_time = time.time() - start_time
-                access_logger.warning(
-                    f"Request failed with status {response.status_code}",
-                    extra={
-                        "request_id": request_id,
-                        "method": request.method,
-                        "url": str(request.url),
-                        "status_code": response.status_code,
-                        "process_time": f"{process_time:.3f}s"
-                    }
-                )
-            
-            return response
-
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
             # 记录错误信息
             process_time = time.time() - start_time
@@ -46,10 +41,24 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 f"Request failed",
                 extra={
                     "request_id": request_id,
-                    "method": request.method,
-                    "url": str(request.url),
+                    "method": scope["method"],
+                    "url": str(Request(scope).url),
                     "process_time": f"{process_time:.3f}s",
                     "error": str(e)
                 }
             )
-            raise 
\ No newline at end of file
+            raise
+
+        # 只记录错误响应
+        if status_code >= 400:
+            process_time = time.time() - start_time
+            access_logger.warning(
+                f"Request failed with status {status_code}",
+                extra={
+                    "request_id": request_id,
+                    "method": scope["method"],
+                    "url": str(Request(scope).url),
+                    "status_code": status_code,
+                    "process_time": f"{process_time:.3f}s"
+                }
+            )
@@ -10,6 +10,8 @@ class PyObjectId(ObjectId):
         
     @classmethod
     def validate(cls, v):
+        if isinstance(v, ObjectId):
+            return v
         if not ObjectId.is_valid(v):
             raise ValueError("Invalid objectid")
         return ObjectId(v)
@@ -45,6 +47,8 @@ class TrafficRecord(MongoBaseModel):
     response_status: int
     response_headers: Dict
     response_body: Optional[Any] = None  # 可以是字典或字符串
+    request_body_ref: Optional[PyObjectId] = None  # 超大请求体在GridFS中的文件ID
+    response_body_ref: Optional[PyObjectId] = None  # 超大响应体在GridFS中的文件ID
     timing: Optional[Dict[str, Any]] = None
     har_file: Optional[str] = None
 
@@ -74,7 +78,8 @@ class TestCase(MongoBaseModel):
     tags: Optional[List[str]] = None
     status: str = "draft"  # draft, ready, running, passed, failed
     last_run: Optional[datetime] = None
-    last_result: Optional[Dict] = None
+    last_result: Optional[Dict] = None  # 旧数据中内嵌的完整结果
+    last_result_id: Optional[PyObjectId] = None  # 最近一次测试结果ID
 
 class TestResult(MongoBaseModel):
     """测试结果模型"""
@@ -1,8 +1,38 @@
 from typing import Dict, List, Optional, Any
-import json
+from functools import lru_cache
 import logging
+import re
 from datetime import datetime
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import ParseResult, urlparse, parse_qsl
+
+import orjson
+
+# 参数类型推断用的数字格式
+_INT_RE = re.compile(r'[-+]?\d+')
+_FLOAT_RE = re.compile(r'[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?')
+# float()接受的非数字写法
+_FLOAT_WORDS = frozenset({'nan', 'inf', 'infinity'})
+
+def _maybe_numeric(value: str) -> bool:
+    """正则未命中但int()/float()仍可能接受的值：带空白、下划线、非ASCII数字或nan/inf"""
+    return any(c.isdigit() for c in value) or value.strip().lstrip('+-').lower() in _FLOAT_WORDS
+
+def _first_values(query: str) -> Dict[str, str]:
+    """解析查询字符串，同名参数取第一个值"""
+    params = {}
+    for k, v in parse_qsl(query, keep_blank_values=True):
+        params.setdefault(k, v)
+    return params
+
+@lru_cache(maxsize=256)
+def mime_token(content_type: str) -> str:
+    """取MIME类型主体并转小写，如'Application/JSON; charset=utf-8' -> 'application/json'"""
+    return content_type.split(';', 1)[0].strip().lower()
+
+@lru_cache(maxsize=4096)
+def cached_urlparse(url: str) -> ParseResult:
+    """带缓存的urlparse，轮询、重试等重复URL直接复用解析结果"""
+    return urlparse(url)
 
 class BaseParser:
     """解析器基础类"""
@@ -18,21 +48,22 @@ class BaseParser:
     
     def _get_content_type(self, headers: Dict[str, str]) -> str:
         """获取Content-Type"""
-        content_type = headers.get('Content-Type', '').lower()
-        return content_type.split(';')[0].strip()
+        return mime_token(headers.get('Content-Type', ''))
     
     def _parse_json(self, content: str) -> Dict:
         """解析JSON数据"""
+        if not content:
+            return {}
         try:
-            return json.loads(content)
-        except json.JSONDecodeError as e:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError as e:
             logging.warning(f"Failed to parse JSON: {e}")
             return {}
     
     def _parse_form(self, content: str) -> Dict:
         """解析表单数据"""
         try:
-            return {k: v[0] for k, v in parse_qs(content).items()}
+            return _first_values(content)
         except Exception as e:
             logging.warning(f"Failed to parse form data: {e}")
             return {}
@@ -58,8 +89,8 @@ class BaseParser:
     def _extract_query_params(self, url: str) -> Dict:
         """提取URL查询参数"""
         try:
-            parsed = urlparse(url)
-            return {k: v[0] for k, v in parse_qs(parsed.query).items()}
+            parsed = cached_urlparse(url)
+            return _first_values(parsed.query)
         except Exception as e:
             logging.warning(f"Failed to extract query params: {e}")
             return {}
@@ -82,21 +113,33 @@ class BaseParser:
     
     def _infer_param_type(self, value: str) -> str:
         """推断参数类型"""
-        try:
-            int(value)
+        # 先用正则判断数字，避免对非数字字符串反复抛出异常
+        if _INT_RE.fullmatch(value):
             return 'integer'
-        except ValueError:
+        if _FLOAT_RE.fullmatch(value):
+            return 'number'
+        # 其余写法交给int()/float()确认，结果与逐个转换保持一致
+        if _maybe_numeric(value):
+            try:
+                int(value)
+                return 'integer'
+            except ValueError:
+                pass
             try:
                 float(value)
                 return 'number'
             except ValueError:
-                if value.lower() in ('true', 'false'):
-                    return 'boolean'
-                try:
-                    datetime.fromisoformat(value)
-                    return 'datetime'
-                except ValueError:
-                    return 'string'
+                pass
+        if value.lower() in ('true', 'false'):
+            return 'boolean'
+        # ISO格式的日期时间以数字开头
+        if value[:1].isdigit():
+            try:
+                datetime.fromisoformat(value)
+                return 'datetime'
+            except ValueError:
+                pass
+        return 'string'
     
     def _generate_param_schema(self, params: Dict) -> Dict:
         """生成参数的Schema"""
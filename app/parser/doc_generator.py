@@ -1,8 +1,11 @@
 from typing import Dict, List, Optional
+from functools import lru_cache
+import asyncio
 import json
 import logging
 from datetime import datetime
 import os
+import orjson
 from jinja2 import Environment, FileSystemLoader
 
 class APIDocGenerator:
@@ -12,12 +15,14 @@ class APIDocGenerator:
         if template_dir is None:
             template_dir = os.path.join(os.path.dirname(__file__), 'templates')
         self.env = Environment(loader=FileSystemLoader(template_dir))
+        # 预加载模板，避免每次生成时查找
+        self._md_tpl = self.env.get_template('api_doc.md')
+        self._html_tpl = self.env.get_template('api_doc.html')
         
     def generate_markdown(self, api_docs: List[Dict]) -> str:
         """生成Markdown格式文档"""
         try:
-            template = self.env.get_template('api_doc.md')
-            return template.render(apis=api_docs)
+            return self._md_tpl.render(apis=api_docs)
         except Exception as e:
             logging.error(f"Error generating markdown doc: {e}")
             return ""
@@ -52,71 +57,19 @@ class APIDocGenerator:
     def generate_html(self, api_docs: List[Dict]) -> str:
         """生成HTML格式文档"""
         try:
-            template = self.env.get_template('api_doc.html')
-            return template.render(apis=api_docs)
+            return self._html_tpl.render(apis=api_docs)
         except Exception as e:
             logging.error(f"Error generating HTML doc: {e}")
             return ""
             
     def _convert_to_openapi_operation(self, doc: Dict) -> Dict:
-        """转换为OpenAPI操作对象"""
-        operation = {
-            'summary': doc.get('description', ''),
-            'parameters': [],
-            'responses': {
-                str(doc['response']['status_code']): {
-                    'description': 'Successful response',
-                    'content': {}
-                }
-            }
-        }
-        
-        # 添加请求头参数
-        for name, header in doc['request']['headers'].items():
-            if header['required']:
-                operation['parameters'].append({
-                    'name': name,
-                    'in': 'header',
-                    'required': True,
-                    'schema': {
-                        'type': header['type']
-                    },
-                    'example': header['example']
-                })
-                
-        # 添加查询参数
-        if doc['request'].get('query_params'):
-            for name, param in doc['request']['query_params']['properties'].items():
-                operation['parameters'].append({
-                    'name': name,
-                    'in': 'query',
-                    'required': False,
-                    'schema': {
-                        'type': param['type']
-                    },
-                    'example': param.get('example')
-                })
-                
-        # 添加请求体
-        if doc['request'].get('body'):
-            operation['requestBody'] = {
-                'required': True,
-                'content': {
-                    'application/json': {
-                        'schema': doc['request']['body']
-                    }
-                }
-            }
-            
-        # 添加响应体
-        if doc['response'].get('body'):
-            operation['responses'][str(doc['response']['status_code'])]['content'] = {
-                'application/json': {
-                    'schema': doc['response']['body']
-                }
-            }
-            
-        return operation
+        """转换为OpenAPI操作对象（按文档内容缓存，返回值为共享对象，不要修改）"""
+        try:
+            key = orjson.dumps(doc, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            # 含有无法序列化的值时不缓存
+            return _build_openapi_operation(doc)
+        return _cached_openapi_operation(key)
         
     def save_docs(self, api_docs: List[Dict], output_dir: str, formats: List[str] = None):
         """保存API文档"""
@@ -126,16 +79,104 @@ class APIDocGenerator:
         os.makedirs(output_dir, exist_ok=True)
         
         if 'markdown' in formats:
-            markdown_content = self.generate_markdown(api_docs)
-            with open(os.path.join(output_dir, 'api_docs.md'), 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
-                
+            self._save_markdown(api_docs, output_dir)
         if 'openapi' in formats:
-            openapi_content = self.generate_openapi(api_docs)
-            with open(os.path.join(output_dir, 'openapi.json'), 'w', encoding='utf-8') as f:
-                json.dump(openapi_content, f, indent=2, ensure_ascii=False)
-                
+            self._save_openapi(api_docs, output_dir)
         if 'html' in formats:
-            html_content = self.generate_html(api_docs)
-            with open(os.path.join(output_dir, 'api_docs.html'), 'w', encoding='utf-8') as f:
-                f.write(html_content) 
\ No newline at end of file
+            self._save_html(api_docs, output_dir)
+            
+    async def save_docs_async(self, api_docs: List[Dict], output_dir: str, formats: List[str] = None):
+        """并发生成并保存各格式的API文档"""
+        if formats is None:
+            formats = ['markdown', 'openapi', 'html']
+            
+        os.makedirs(output_dir, exist_ok=True)
+        
+        savers = {
+            'markdown': self._save_markdown,
+            'openapi': self._save_openapi,
+            'html': self._save_html
+        }
+        await asyncio.gather(*(
+            asyncio.to_thread(savers[fmt], api_docs, output_dir)
+            for fmt in formats if fmt in savers
+        ))
+        
+    def _save_markdown(self, api_docs: List[Dict], output_dir: str):
+        markdown_content = self.generate_markdown(api_docs)
+        with open(os.path.join(output_dir, 'api_docs.md'), 'w', encoding='utf-8') as f:
+            f.write(markdown_content)
+            
+    def _save_openapi(self, api_docs: List[Dict], output_dir: str):
+        openapi_content = self.generate_openapi(api_docs)
+        with open(os.path.join(output_dir, 'openapi.json'), 'w', encoding='utf-8') as f:
+            json.dump(openapi_content, f, indent=2, ensure_ascii=False)
+            
+    def _save_html(self, api_docs: List[Dict], output_dir: str):
+        html_content = self.generate_html(api_docs)
+        with open(os.path.join(output_dir, 'api_docs.html'), 'w', encoding='utf-8') as f:
+            f.write(html_content)
+
+@lru_cache(maxsize=4096)
+def _cached_openapi_operation(key: bytes) -> Dict:
+    # key是文档的规范化JSON，反序列化后与原文档等价
+    return _build_openapi_operation(orjson.loads(key))
+
+def _build_openapi_operation(doc: Dict) -> Dict:
+    operation = {
+        'summary': doc.get('description', ''),
+        'parameters': [],
+        'responses': {
+            str(doc['response']['status_code']): {
+                'description': 'Successful response',
+                'content': {}
+            }
+        }
+    }
+    
+    # 添加请求头参数
+    for name, header in doc['request']['headers'].items():
+        if header['required']:
+            operation['parameters'].append({
+                'name': name,
+                'in': 'header',
+                'required': True,
+                'schema': {
+                    'type': header['type']
+                },
+                'example': header['example']
+            })
+            
+    # 添加查询参数
+    if doc['request'].get('query_params'):
+        for name, param in doc['request']['query_params']['properties'].items():
+            operation['parameters'].append({
+                'name': name,
+                'in': 'query',
+                'required': False,
+                'schema': {
+                    'type': param['type']
+                },
+                'example': param.get('example')
+            })
+            
+    # 添加请求体
+    if doc['request'].get('body'):
+        operation['requestBody'] = {
+            'required': True,
+            'content': {
+                'application/json': {
+                    'schema': doc['request']['body']
+                }
+            }
+        }
+        
+    # 添加响应体
+    if doc['response'].get('body'):
+        operation['responses'][str(doc['response']['status_code'])]['content'] = {
+            'application/json': {
+                'schema': doc['response']['body']
+            }
+        }
+        
+    return operation
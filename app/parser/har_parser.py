@@ -1,10 +1,51 @@
-from typing import Dict, List, Optional
-import json
+from typing import Dict, Iterator, List, Optional
+import base64
+import orjson
+import ijson
 import logging
 from datetime import datetime
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import parse_qsl
 import re
 
+from .base import cached_urlparse, mime_token
+
+# 优先使用C实现的yajl2_c后端，不可用时退回ijson默认选择的后端
+try:
+    _ijson = ijson.get_backend('yajl2_c')
+except ImportError:
+    _ijson = ijson
+
+def _parse_query(query: str) -> Dict:
+    """解析查询字符串，单个值直接保存，同名参数出现多次时保存为列表"""
+    params = {}
+    for k, v in parse_qsl(query, keep_blank_values=True):
+        if k in params:
+            cur = params[k]
+            if isinstance(cur, list):
+                cur.append(v)
+            else:
+                params[k] = [cur, v]
+        else:
+            params[k] = v
+    return params
+
+def _parse_json_body(text: str, post_data: Dict):
+    return orjson.loads(text)
+
+def _parse_form_body(text: str, post_data: Dict) -> Dict:
+    return _parse_query(text)
+
+def _parse_multipart_body(text: str, post_data: Dict) -> Dict:
+    # 对于multipart/form-data，返回参数列表
+    return {'params': list(post_data.get('params', []))}
+
+# 请求体按MIME类型分派的解析函数，未列出的类型按原文本返回
+_MIME_DISPATCH = {
+    'application/json': _parse_json_body,
+    'application/x-www-form-urlencoded': _parse_form_body,
+    'multipart/form-data': _parse_multipart_body
+}
+
 class HARParser:
     """HAR文件解析器"""
     
@@ -18,6 +59,17 @@ class HARParser:
             r'.*/socket\.io/.*$',
             r'.*/websocket/.*$'
         ]
+        # 静态资源扩展名，先用集合查找快速判断，未命中时再走正则
+        self._noise_exts = frozenset({
+            'jpg', 'jpeg', 'png', 'gif', 'ico', 'css', 'js', 'woff', 'woff2', 'ttf', 'svg',
+            'mp4', 'webm', 'ogg', 'mp3', 'wav',
+            'pdf', 'doc', 'docx', 'xls', 'xlsx'
+        })
+        # 合并为一个预编译的正则，每个URL只扫描一次
+        self._noise_re = re.compile(
+            '|'.join(f'(?:{pattern})' for pattern in self.noise_patterns),
+            re.IGNORECASE
+        )
         
     def parse_file(self, file_path: str, host_filter: Optional[str] = None) -> List[Dict]:
         """解析HAR文件
@@ -30,29 +82,32 @@ class HARParser:
             解析后的请求列表
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                har_data = json.load(f)
-                
-            entries = har_data.get('log', {}).get('entries', [])
-            parsed_entries = []
+            return list(self.iter_entries(file_path, host_filter))
+        except Exception as e:
+            logging.error(f"Failed to parse HAR file {file_path}: {e}")
+            raise
             
-            for entry in entries:
+    def iter_entries(self, file_path: str, host_filter: Optional[str] = None) -> Iterator[Dict]:
+        """流式解析HAR文件，逐条产出解析后的请求
+        
+        使用ijson按log.entries逐条读取，内存占用与单条请求相当，而非整个文件。
+        
+        Args:
+            file_path: HAR文件路径
+            host_filter: 可选的host过滤器，只解析指定host的请求
+        """
+        with open(file_path, 'rb') as f:
+            for entry in _ijson.items(f, 'log.entries.item', use_float=True):
                 try:
-                    parsed_entry = self._parse_entry(entry)
-                    if parsed_entry and self._should_process(parsed_entry, host_filter):
-                        parsed_entries.append(parsed_entry)
+                    parsed_entry = self._parse_entry(entry, host_filter)
+                    if parsed_entry:
+                        yield parsed_entry
                 except Exception as e:
                     logging.warning(f"Failed to parse entry: {e}")
                     continue
-                    
-            return parsed_entries
-            
-        except Exception as e:
-            logging.error(f"Failed to parse HAR file {file_path}: {e}")
-            raise
             
-    def _parse_entry(self, entry: Dict) -> Optional[Dict]:
-        """解析单个请求条目"""
+    def _parse_entry(self, entry: Dict, host_filter: Optional[str] = None) -> Optional[Dict]:
+        """解析单个请求条目，噪声请求和不匹配host_filter的请求返回None"""
         try:
             request = entry['request']
             response = entry['response']
@@ -62,17 +117,17 @@ class HARParser:
             if self._is_noise(url):
                 return None
                 
-            parsed_url = urlparse(url)
+            parsed_url = cached_urlparse(url)
+            
+            # 先按host过滤，被过滤的请求不再解析请求头和请求/响应体
+            if host_filter and parsed_url.netloc != host_filter:
+                return None
             
             # 解析请求头
             headers = {h['name']: h['value'] for h in request['headers']}
             
             # 解析请求参数
-            query_params = {}
-            if parsed_url.query:
-                query_params = parse_qs(parsed_url.query)
-                # 将所有值从列表转换为单个值
-                query_params = {k: v[0] if len(v) == 1 else v for k, v in query_params.items()}
+            query_params = _parse_query(parsed_url.query) if parsed_url.query else {}
                 
             # 解析请求体
             request_body = None
@@ -111,19 +166,9 @@ class HARParser:
             if 'text' not in post_data:
                 return None
                 
-            mime_type = post_data.get('mimeType', '').lower()
             text = post_data['text']
-            
-            if 'application/json' in mime_type:
-                return json.loads(text)
-            elif 'application/x-www-form-urlencoded' in mime_type:
-                params = parse_qs(text)
-                return {k: v[0] if len(v) == 1 else v for k, v in params.items()}
-            elif 'multipart/form-data' in mime_type:
-                # 对于multipart/form-data，返回参数列表
-                return {'params': [p for p in post_data.get('params', [])]}
-            else:
-                return text
+            handler = _MIME_DISPATCH.get(mime_token(post_data.get('mimeType', '')))
+            return handler(text, post_data) if handler else text
                 
         except Exception as e:
             logging.warning(f"Failed to parse request body: {e}")
@@ -135,13 +180,17 @@ class HARParser:
             if 'text' not in content:
                 return None
                 
-            mime_type = content.get('mimeType', '').lower()
             text = content['text']
+            is_json = mime_token(content.get('mimeType', '')) == 'application/json'
             
-            if 'application/json' in mime_type:
-                return json.loads(text)
-            else:
-                return text
+            if content.get('encoding') == 'base64':
+                # base64编码的非JSON内容多为图片等二进制数据，不解码也不保存
+                if not is_json:
+                    return None
+                return orjson.loads(base64.b64decode(text))
+            if is_json:
+                return orjson.loads(text)
+            return text
                 
         except Exception as e:
             logging.warning(f"Failed to parse response body: {e}")
@@ -149,11 +198,8 @@ class HARParser:
             
     def _is_noise(self, url: str) -> bool:
         """检查是否为噪声请求"""
-        return any(re.match(pattern, url, re.IGNORECASE) for pattern in self.noise_patterns)
-        
-    def _should_process(self, entry: Dict, host_filter: Optional[str]) -> bool:
-        """检查是否应该处理该请求"""
-        if not host_filter:
+        # 去掉查询参数后按扩展名判断，带版本号的静态资源(如app.js?v=1)也能识别
+        path = url.split('?', 1)[0]
+        if path.rpartition('.')[2].lower() in self._noise_exts:
             return True
-            
-        return entry['host'] == host_filter 
\ No newline at end of file
+        return self._noise_re.match(url) is not None
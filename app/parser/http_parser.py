@@ -1,10 +1,94 @@
 from typing import Dict, List, Optional, Any
-import json
+from collections import Counter
 import logging
 from datetime import datetime
-from urllib.parse import urlparse
 
-from .base import BaseParser
+from .base import BaseParser, cached_urlparse
+
+def _flatten_tokens(obj: Any) -> set:
+    """收集JSON结构中所有的键和标量值"""
+    out = set()
+    stack = [obj]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, dict):
+            out.update(x.keys())
+            stack.extend(x.values())
+        elif isinstance(x, list):
+            stack.extend(x)
+        elif isinstance(x, (str, int, float, bool)):
+            out.add(x)
+    return out
+
+def _epoch(value: Any) -> float:
+    """将created_at(datetime或ISO格式字符串)转换为时间戳，用作排序键"""
+    if isinstance(value, str):
+        # Python 3.11之前fromisoformat不支持'Z'后缀
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+# 文档中标记为必需的请求/响应头（小写）
+_REQUIRED_HEADERS = frozenset({'content-type', 'authorization'})
+
+# JSON标量的具体类型到Schema类型的映射，按type()精确查找
+_SCALAR_SCHEMAS = {
+    bool: 'boolean',
+    int: 'integer',
+    float: 'number',
+    str: 'string'
+}
+
+def _scalar_schema(data: Any) -> Dict:
+    schema_type = _SCALAR_SCHEMAS.get(type(data))
+    if schema_type is not None:
+        return {'type': schema_type, 'example': data}
+    if data is None:
+        return {'type': 'null'}
+    # 少见的子类(如IntEnum)退回isinstance判断
+    if isinstance(data, bool):
+        return {'type': 'boolean', 'example': data}
+    elif isinstance(data, int):
+        return {'type': 'integer', 'example': data}
+    elif isinstance(data, float):
+        return {'type': 'number', 'example': data}
+    elif isinstance(data, str):
+        return {'type': 'string', 'example': data}
+    return {'type': 'string'}
+
+def _infer_schema(data: Any) -> Dict:
+    """推断JSON数据的Schema
+    
+    使用显式栈迭代，避免深层嵌套时递归过深；同一个子对象出现多次时只推断一次。
+    """
+    root = {}
+    memo = {}
+    stack = [(data, root)]
+    while stack:
+        obj, schema = stack.pop()
+        cached = memo.get(id(obj))
+        if cached is not None:
+            # 共享子对象：复用已生成(或待填充)的Schema内容
+            schema.update(cached)
+            continue
+        if isinstance(obj, dict):
+            memo[id(obj)] = schema
+            schema['type'] = 'object'
+            properties = schema['properties'] = {}
+            for key, value in obj.items():
+                child = properties[key] = {}
+                stack.append((value, child))
+        elif isinstance(obj, list):
+            memo[id(obj)] = schema
+            schema['type'] = 'array'
+            # 数组只按第一个元素推断
+            if obj:
+                child = schema['items'] = {}
+                stack.append((obj[0], child))
+        else:
+            schema.update(_scalar_schema(obj))
+    return root
 
 class HTTPParser(BaseParser):
     """HTTP流量解析器"""
@@ -13,7 +97,7 @@ class HTTPParser(BaseParser):
         """解析HTTP请求"""
         try:
             # 基本信息
-            parsed = urlparse(flow_data['url'])
+            parsed = cached_urlparse(flow_data['url'])
             result = {
                 'method': flow_data['method'],
                 'scheme': parsed.scheme,
@@ -95,7 +179,7 @@ class HTTPParser(BaseParser):
         for name, value in headers.items():
             doc[name] = {
                 'type': 'string',
-                'required': name.lower() in ['content-type', 'authorization'],
+                'required': name.lower() in _REQUIRED_HEADERS,
                 'example': value
             }
         return doc
@@ -107,35 +191,6 @@ class HTTPParser(BaseParser):
             'properties': {}
         }
         
-        def _infer_schema(data: Any) -> Dict:
-            if isinstance(data, dict):
-                properties = {}
-                for key, value in data.items():
-                    properties[key] = _infer_schema(value)
-                return {
-                    'type': 'object',
-                    'properties': properties
-                }
-            elif isinstance(data, list):
-                if data:
-                    return {
-                        'type': 'array',
-                        'items': _infer_schema(data[0])
-                    }
-                return {'type': 'array'}
-            elif isinstance(data, bool):
-                return {'type': 'boolean', 'example': data}
-            elif isinstance(data, int):
-                return {'type': 'integer', 'example': data}
-            elif isinstance(data, float):
-                return {'type': 'number', 'example': data}
-            elif isinstance(data, str):
-                return {'type': 'string', 'example': data}
-            elif data is None:
-                return {'type': 'null'}
-            else:
-                return {'type': 'string'}
-                
         schema['properties'] = _infer_schema(body)['properties']
         return schema
         
@@ -148,53 +203,54 @@ class HTTPParser(BaseParser):
         }
         
         # 按时间排序
-        sorted_flows = sorted(flows, key=lambda x: x['created_at'])
+        # sorted对每个元素只计算一次键，比较时只是浮点数比较
+        sorted_flows = sorted(flows, key=lambda x: _epoch(x['created_at']))
         
-        # 分析调用序列
+        # 一次遍历生成调用序列和各API的参数，API标识每条流量只格式化一次
+        keys = []
+        all_params = {}
         for flow in sorted_flows:
+            key = f"{flow['method']} {flow['api_path']}"
+            keys.append(key)
             relations['sequence'].append({
                 'path': flow['api_path'],
                 'method': flow['method'],
                 'timestamp': flow['created_at']
             })
             
-        # 分析依赖关系
-        for i, flow in enumerate(sorted_flows[:-1]):
-            next_flow = sorted_flows[i + 1]
-            current_key = f"{flow['method']} {flow['api_path']}"
-            next_key = f"{next_flow['method']} {next_flow['api_path']}"
-            
-            # 检查响应和下一个请求的关联
-            if isinstance(flow.get('response_body'), dict) and isinstance(next_flow.get('request_body'), dict):
-                common_keys = set(str(flow['response_body']).split()) & set(str(next_flow['request_body']).split())
-                if common_keys:
-                    if current_key not in relations['dependencies']:
-                        relations['dependencies'][current_key] = []
-                    relations['dependencies'][current_key].append({
-                        'target': next_key,
-                        'shared_keys': list(common_keys)
-                    })
-                    
-        # 分析共同参数
-        all_params = {}
-        for flow in flows:
-            key = f"{flow['method']} {flow['api_path']}"
-            params = {}
-            params.update(self._extract_query_params(flow['url']))
+            params = self._extract_query_params(flow['url'])
             if isinstance(flow.get('request_body'), dict):
                 params.update(flow['request_body'])
-                
             all_params[key] = params
             
-        # 找出共同参数
+        # 分析依赖关系：检查响应和下一个请求的关联
+        for i in range(len(sorted_flows) - 1):
+            resp = sorted_flows[i].get('response_body')
+            req = sorted_flows[i + 1].get('request_body')
+            # 任一方为空或不是对象时不可能有关联，跳过
+            if not (resp and req and isinstance(resp, dict) and isinstance(req, dict)):
+                continue
+            common_keys = _flatten_tokens(resp) & _flatten_tokens(req)
+            if common_keys:
+                relations['dependencies'].setdefault(keys[i], []).append({
+                    'target': keys[i + 1],
+                    'shared_keys': list(common_keys)
+                })
+                    
+        # 找出共同参数：统计每个参数出现在多少个API中，等于API总数即为共同参数
         if all_params:
-            param_sets = [set(params.keys()) for params in all_params.values()]
-            common_params = set.intersection(*param_sets)
+            counts = Counter()
+            for params in all_params.values():
+                counts.update(params.keys())
+            n = len(all_params)
+            first_params = next(iter(all_params.values()))
+            used_in = list(all_params.keys())
             
-            for param in common_params:
-                relations['common_params'][param] = {
-                    'type': self._infer_param_type(str(next(iter(all_params.values()))[param])),
-                    'used_in': list(all_params.keys())
-                }
+            for param, count in counts.items():
+                if count == n:
+                    relations['common_params'][param] = {
+                        'type': self._infer_param_type(str(first_params[param])),
+                        'used_in': list(used_in)
+                    }
                 
         return relations 
\ No newline at end of file
@@ -1,8 +1,20 @@
 import os
 import shutil
+import subprocess
+import sys
 import logging
 from pathlib import Path
 
+# 进程运行期间操作系统不会变化，导入时确定一次
+if sys.platform.startswith('win'):
+    _PLATFORM = "windows"
+elif sys.platform.startswith('darwin'):
+    _PLATFORM = "macos"
+elif sys.platform.startswith('linux'):
+    _PLATFORM = "linux"
+else:
+    _PLATFORM = "unknown"
+
 class CertificateManager:
     """证书管理器：只负责读取和复制 mitmproxy 已生成的 CA 证书，不再自动生成。"""
     def __init__(self, cert_dir: str = None):
@@ -12,31 +24,48 @@ class CertificateManager:
         else:
             self.cert_dir = os.path.expanduser(cert_dir)
         self.ca_cert_path = os.path.join(self.cert_dir, "mitmproxy-ca-cert.pem")
+        # 证书生成后不会变化，确认存在后不再重复stat；不存在时每次重新检查
+        self._cert_exists = False
+
+    def _require_cert(self):
+        """检查CA证书是否存在，不存在时抛出FileNotFoundError"""
+        if not self._cert_exists:
+            self._cert_exists = os.path.isfile(self.ca_cert_path)
+            if not self._cert_exists:
+                raise FileNotFoundError("mitmproxy CA证书不存在，请先运行 mitmdump 生成证书")
 
     def get_cert_path(self) -> str:
         """获取CA证书路径"""
-        if not os.path.exists(self.ca_cert_path):
-            raise FileNotFoundError("mitmproxy CA证书不存在，请先运行 mitmdump 生成证书")
+        self._require_cert()
         return self.ca_cert_path
 
-    def copy_cert(self, target_path: str):
-        """复制CA证书到指定位置"""
-        if not os.path.exists(self.ca_cert_path):
-            raise FileNotFoundError("mitmproxy CA证书不存在，请先运行 mitmdump 生成证书")
+    def copy_cert(self, target_path: str, link: bool = False):
+        """复制CA证书到指定位置
+        
+        link=True时优先创建硬链接（同一文件系统内不复制数据，适合批量分发），
+        目标与证书共享同一份数据，不要修改目标文件；无法链接时退回普通复制。
+        """
+        self._require_cert()
+        if link:
+            try:
+                os.link(self.ca_cert_path, target_path)
+                logging.info(f"CA证书已链接到: {target_path}")
+                return
+            except OSError:
+                pass
+        # shutil在Linux/macOS上已使用sendfile/fcopyfile在内核中复制
         shutil.copy2(self.ca_cert_path, target_path)
         logging.info(f"CA证书已复制到: {target_path}")
 
 # 兼容旧接口
     def ensure_ca_cert(self):
         """兼容旧接口：仅检查证书是否存在，不再生成"""
-        if not os.path.exists(self.ca_cert_path):
-            raise FileNotFoundError("mitmproxy CA证书不存在，请先运行 mitmdump 生成证书")
+        self._require_cert()
         return True
             
     def install_cert(self, platform: str = None):
         """安装证书到系统"""
-        if not os.path.exists(self.ca_cert_path):
-            raise FileNotFoundError("CA certificate not found")
+        self._require_cert()
             
         if platform is None:
             platform = self._detect_platform()
@@ -59,15 +88,7 @@ class CertificateManager:
             
     def _detect_platform(self) -> str:
         """检测操作系统类型"""
-        import sys
-        if sys.platform.startswith('win'):
-            return "windows"
-        elif sys.platform.startswith('darwin'):
-            return "macos"
-        elif sys.platform.startswith('linux'):
-            return "linux"
-        else:
-            return "unknown"
+        return _PLATFORM
             
     def _install_cert_windows(self):
         """在Windows上安装证书"""
@@ -3,15 +3,15 @@ import sys
 import subprocess
 import logging
 import asyncio
-import threading
-import winreg
 from typing import Optional, List, Dict
 from mitmproxy.options import Options
-from mitmproxy.tools.dump import DumpMaster
-from mitmproxy.addons import core
+from mitmproxy.master import Master
+from mitmproxy.addons import core, default_addons
 from app.proxy.handlers import TrafficHandler
 from app.proxy.filters import TrafficFilter
+from app.proxy.matcher import build_host_trie, match_host_trie
 from app.db.mongo_client import get_database
+from app.services.host_rule_cache import host_rule_cache
 import traceback
 import time
 
@@ -28,11 +28,57 @@ KEY_XPATH = r"Software\Microsoft\Windows\CurrentVersion\Internet Settings"
 KEY_ProxyEnable = "ProxyEnable"
 KEY_ProxyServer = "ProxyServer"
 KEY_ProxyOverride = "ProxyOverride"
+INTERNET_OPTION_SETTINGS_CHANGED = 39
+INTERNET_OPTION_REFRESH = 37
 DEFAULT_PROXY_IGNORE = "localhost;127.*;10.*;172.16.*;172.17.*;172.18.*;172.19.*;172.20.*;172.21.*;172.22.*;172.23.*;172.24.*;172.25.*;172.26.*;172.27.*;172.28.*;172.29.*;172.30.*;172.31.*;192.168.*;<local>"
 
+# Linux代理环境变量写入独立文件，~/.bashrc中只保留一行加载语句
+PROXY_ENV_FILE = os.path.expanduser("~/.config/api_test_proxy.sh")
+_BASHRC_HOOK = "[ -f ~/.config/api_test_proxy.sh ] && . ~/.config/api_test_proxy.sh"
+_PROXY_ENV_NAMES = ("http_proxy", "https_proxy", "HTTP_PROXY", "HTTPS_PROXY")
+# 旧版本直接追加到~/.bashrc的export行
+_LEGACY_EXPORT_PREFIXES = tuple(f"export {name}=http://127.0.0.1:" for name in _PROXY_ENV_NAMES)
+
+# winreg和wininet只在Windows上可用；InternetSetOptionW在导入时解析一次
+if sys.platform == "win32":
+    import ctypes
+    import winreg
+    from ctypes import wintypes
+    _InternetSetOption = ctypes.WinDLL("wininet", use_last_error=True).InternetSetOptionW
+    _InternetSetOption.argtypes = (wintypes.HANDLE, wintypes.DWORD, wintypes.LPVOID, wintypes.DWORD)
+    _InternetSetOption.restype = wintypes.BOOL
+else:
+    winreg = None
+    _InternetSetOption = None
+
+class ProxyMaster(Master):
+    """嵌入API事件循环运行的mitmproxy master
+
+    与DumpMaster不同：不加载errorcheck（启动出错时会sys.exit）、termlog和dumper，
+    也不替换事件循环的异常处理器。
+    """
+    
+    def __init__(self, opts: Options):
+        super().__init__(opts)
+        self.addons.add(*default_addons())
+        
+    async def setup(self):
+        """监听代理端口，失败时抛出异常"""
+        if not await self.addons.get("proxyserver").setup_servers():
+            raise RuntimeError(f"Failed to listen on port {self.options.listen_port}")
+            
+    async def run(self) -> None:
+        """运行直到shutdown，调用前需先完成setup"""
+        self.should_exit.clear()
+        await self.running()
+        try:
+            await self.should_exit.wait()
+        finally:
+            await self.done()
+
 class ProxyServer:
     def __init__(self):
-        self.master: Optional[DumpMaster] = None
+        self.master: Optional[ProxyMaster] = None
         self.port: Optional[int] = None
         self.mode: str = "system"
         self.enable_https: bool = True
@@ -40,42 +86,52 @@ class ProxyServer:
         self.traffic_handler = TrafficHandler(self)
         self.traffic_filter = TrafficFilter()
         self.host_rules: Dict[str, bool] = {}  # 域名规则缓存
+        self._host_trie: dict = {}  # 按反转标签构建的域名规则树
+        self._proxy_task: Optional[asyncio.Task] = None  # 运行mitmproxy的任务
+        self._rules_source: Optional[list] = None  # 构建当前索引所用的缓存规则列表
+        self._proxy_override_written = False  # 本进程是否已写入过代理忽略地址
 
     def is_running(self) -> bool:
         """检查代理服务是否运行中"""
         return self._running and self.master is not None
 
-    async def load_host_rules(self):
-        """从数据库加载Host规则"""
+    async def load_host_rules(self, force: bool = False):
+        """加载Host规则并构建匹配索引
+        
+        默认读取Host规则缓存（未失效且未过期时不访问数据库），force=True时从数据库刷新；
+        规则列表与上次相同时不重建索引。
+        """
         try:
             db = await get_database()
+            docs = await (host_rule_cache.refresh(db) if force else host_rule_cache.get(db))
+            if docs is self._rules_source:
+                return
             rules = {}
-            async for rule in db.host_rules.find({"enabled": True}):
+            for rule in docs:
+                if not rule.get("enabled"):
+                    continue
                 host = rule["host"]
                 include_subdomains = rule.get("includeSubdomains", False)
                 rules[host] = include_subdomains
             self.host_rules = rules
+            self._rules_source = docs
             logger.info(f"Loaded {len(rules)} host rules")
         except Exception as e:
             logger.error(f"Failed to load host rules: {e}")
             # 数据库连接失败时，使用空的规则集，不影响代理启动
             self.host_rules = {}
+            self._rules_source = None
+        self._build_host_index(self.host_rules)
+
+    def _build_host_index(self, rules: Dict[str, bool]):
+        """构建域名匹配索引：按反转标签构建规则树，规则终点记录是否包含子域名"""
+        self._host_trie = build_host_trie(rules)
 
     def should_filter_host(self, host: str) -> bool:
         """检查是否应该保存指定域名的流量（True=保存，False=过滤）"""
         if not host or not self.host_rules:
             return False
-
-        # 精确匹配
-        if host in self.host_rules:
-            return True
-
-        # 子域名匹配
-        for rule_host, include_subdomains in self.host_rules.items():
-            if include_subdomains and host.endswith(f".{rule_host}"):
-                return True
-
-        return False
+        return match_host_trie(self._host_trie, host)
 
     async def start(self, port: int, enable_https: bool = True):
         """启动代理服务"""
@@ -98,69 +154,40 @@ class ProxyServer:
                 ssl_insecure=True
             )
 
-            # 创建DumpMaster实例
-            self.master = DumpMaster(opts)
-
-            # 添加流量处理器
+            # 创建master实例并添加流量处理器
+            self.master = ProxyMaster(opts)
             self.master.addons.add(self.traffic_handler)
             self.master.addons.add(self.traffic_filter)
 
+            # 端口监听失败直接报错，不进入运行状态
+            await self.master.setup()
+
             # 更新状态
             self.port = port
             self.enable_https = enable_https
             self._running = True
 
-            # 在新线程中运行代理服务
-            def run_proxy():
-                try:
-                    # 确保在新线程中创建新的事件循环
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    
-                    # 在新事件循环中重新初始化master
-                    try:
-                        # 重新创建DumpMaster实例，确保它绑定到新的事件循环
-                        opts = Options(
-                            listen_host="0.0.0.0",
-                            listen_port=port,
-                            ssl_insecure=True
-                        )
-                        
-                        # 在事件循环中创建DumpMaster
-                        async def create_and_run_master():
-                            master = DumpMaster(opts)
-                            master.addons.add(self.traffic_handler)
-                            master.addons.add(self.traffic_filter)
-                            await master.run()
-                        
-                        # 在新事件循环中运行
-                        loop.run_until_complete(create_and_run_master())
-                    except Exception as e:
-                        logger.error(f"Proxy server error: {e}")
-                        logger.error(traceback.format_exc())
-                        self._running = False
-                        self.master = None
-                    finally:
-                        loop.close()
-                        
-                except Exception as e:
-                    if self._running:  # 只有在正常运行时才记录错误
-                        logger.error(f"Proxy server error: {e}")
-                        logger.error(traceback.format_exc())
-                    self._running = False
-                    self.master = None
-
-            # 创建并保存线程对象
-            self._proxy_thread = threading.Thread(target=run_proxy, daemon=True)
-            self._proxy_thread.start()
+            # 在应用的事件循环中运行代理服务，与数据库客户端共用同一个循环
+            self._proxy_task = asyncio.create_task(self._run_master(self.master))
             logger.info(f"Proxy server started on port {port}")
 
         except Exception as e:
             logger.error(f"Failed to start proxy server: {e}")
             self._running = False
+            self.master = None
             raise
 
-    def stop(self):
+    async def _run_master(self, master: ProxyMaster):
+        """运行mitmproxy直到shutdown，异常退出时重置状态"""
+        try:
+            await master.run()
+        except Exception as e:
+            logger.error(f"Proxy server error: {e}")
+            logger.error(traceback.format_exc())
+            self._running = False
+            self.master = None
+
+    async def stop(self):
         """停止代理服务"""
         if not self.is_running():
             logger.warning("Proxy server is not running")
@@ -168,21 +195,19 @@ class ProxyServer:
         try:
             logger.info("Stopping proxy server...")
             if self.master:
-                # 先设置运行状态为False，让线程知道需要停止
+                # 先设置运行状态为False
                 self._running = False
                 
-                # 调用mitmproxy的shutdown方法
+                # 调用mitmproxy的shutdown方法，并等待运行任务结束
                 self.master.shutdown()
                 logger.info("Called self.master.shutdown()")
-                
-                # 等待线程自然结束
-                if hasattr(self, '_proxy_thread') and self._proxy_thread and self._proxy_thread.is_alive():
-                    logger.info("Waiting for proxy thread to exit...")
-                    self._proxy_thread.join(timeout=10)
-                    if self._proxy_thread.is_alive():
-                        logger.warning("Proxy thread did not exit within timeout, forcing cleanup")
-                    else:
-                        logger.info("Proxy thread exited successfully")
+                if self._proxy_task is not None:
+                    try:
+                        await asyncio.wait_for(self._proxy_task, timeout=10)
+                        logger.info("Proxy task exited successfully")
+                    except asyncio.TimeoutError:
+                        logger.warning("Proxy task did not exit within timeout, forcing cleanup")
+                    self._proxy_task = None
                 
                 # 清理master实例
                 self.master = None
@@ -199,6 +224,8 @@ class ProxyServer:
             self._running = False
             self.port = None
             self.host_rules.clear()
+            self._rules_source = None
+            self._build_host_index(self.host_rules)
             logger.info("Proxy server stopped successfully")
         except Exception as e:
             logger.error(f"Failed to stop proxy server: {e}")
@@ -207,6 +234,42 @@ class ProxyServer:
             self.master = None
             raise
 
+    def _write_windows_proxy(self, enable: int, proxy_server: str):
+        """写入Windows代理注册表项并通知系统设置已更改"""
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, KEY_XPATH, 0, winreg.KEY_WRITE) as hKey:
+            winreg.SetValueEx(hKey, KEY_ProxyEnable, 0, winreg.REG_DWORD, enable)  # 启用/禁用代理
+            winreg.SetValueEx(hKey, KEY_ProxyServer, 0, winreg.REG_SZ, proxy_server)  # 设置/清除代理服务器
+            # 忽略地址固定不变，每个进程只需写入一次
+            if not self._proxy_override_written:
+                winreg.SetValueEx(hKey, KEY_ProxyOverride, 0, winreg.REG_SZ, DEFAULT_PROXY_IGNORE)
+                self._proxy_override_written = True
+        _InternetSetOption(None, INTERNET_OPTION_SETTINGS_CHANGED, None, 0)
+        _InternetSetOption(None, INTERNET_OPTION_REFRESH, None, 0)
+
+    def _write_proxy_env(self, content: str):
+        """原子地写入代理环境变量文件（新终端中生效）"""
+        os.makedirs(os.path.dirname(PROXY_ENV_FILE), exist_ok=True)
+        tmp_path = f"{PROXY_ENV_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, PROXY_ENV_FILE)
+
+    def _ensure_bashrc_hook(self):
+        """确保~/.bashrc加载代理环境变量文件，同时移除旧版本追加的export行"""
+        bashrc_path = os.path.expanduser("~/.bashrc")
+        lines = []
+        if os.path.exists(bashrc_path):
+            with open(bashrc_path, "r") as f:
+                lines = f.readlines()
+        if any(line.strip() == _BASHRC_HOOK for line in lines):
+            return
+        kept = [line for line in lines if not line.startswith(_LEGACY_EXPORT_PREFIXES)]
+        if kept and not kept[-1].endswith("\n"):
+            kept[-1] += "\n"
+        kept.append(_BASHRC_HOOK + "\n")
+        with open(bashrc_path, "w") as f:
+            f.writelines(kept)
+
     def set_system_proxy(self, port: int):
         """设置系统代理"""
         try:
@@ -214,20 +277,7 @@ class ProxyServer:
                 # Windows系统代理设置
                 proxy_server = f"127.0.0.1:{port}"
                 try:
-                    hKey = winreg.OpenKey(winreg.HKEY_CURRENT_USER, KEY_XPATH, 0, winreg.KEY_WRITE)
-                    winreg.SetValueEx(hKey, KEY_ProxyEnable, 0, winreg.REG_DWORD, 1)  # 启用代理
-                    winreg.SetValueEx(hKey, KEY_ProxyServer, 0, winreg.REG_SZ, proxy_server)  # 设置代理服务器
-                    winreg.SetValueEx(hKey, KEY_ProxyOverride, 0, winreg.REG_SZ, DEFAULT_PROXY_IGNORE)  # 设置忽略地址
-                    winreg.CloseKey(hKey)
-
-                    # 通知系统代理设置已更改
-                    import ctypes
-                    INTERNET_OPTION_SETTINGS_CHANGED = 39
-                    INTERNET_OPTION_REFRESH = 37
-                    internet_set_option = ctypes.windll.Wininet.InternetSetOptionW
-                    internet_set_option(0, INTERNET_OPTION_SETTINGS_CHANGED, 0, 0)
-                    internet_set_option(0, INTERNET_OPTION_REFRESH, 0, 0)
-
+                    self._write_windows_proxy(1, proxy_server)
                     logger.info(f"系统代理已开启: {proxy_server}")
                 except Exception as e:
                     logger.error(f"设置系统代理失败: {e}")
@@ -250,19 +300,12 @@ class ProxyServer:
                             service, "127.0.0.1", str(port)
                         ], check=True)
             else:
-                # Linux系统代理设置
-                proxy_settings = [
-                    f"export http_proxy=http://127.0.0.1:{port}",
-                    f"export https_proxy=http://127.0.0.1:{port}",
-                    f"export HTTP_PROXY=http://127.0.0.1:{port}",
-                    f"export HTTPS_PROXY=http://127.0.0.1:{port}"
-                ]
-                
-                with open(os.path.expanduser("~/.bashrc"), "a") as f:
-                    for setting in proxy_settings:
-                        f.write(f"\n{setting}")
-                
-                subprocess.run(["source", "~/.bashrc"], shell=True, check=True)
+                # Linux系统代理设置：整体替换代理环境变量文件
+                proxy_url = f"http://127.0.0.1:{port}"
+                self._write_proxy_env("".join(
+                    f"export {name}={proxy_url}\n" for name in _PROXY_ENV_NAMES
+                ))
+                self._ensure_bashrc_hook()
             
             logger.info(f"System proxy set to 127.0.0.1:{port}")
         except Exception as e:
@@ -275,20 +318,7 @@ class ProxyServer:
             if sys.platform == "win32":
                 # Windows清除系统代理
                 try:
-                    hKey = winreg.OpenKey(winreg.HKEY_CURRENT_USER, KEY_XPATH, 0, winreg.KEY_WRITE)
-                    winreg.SetValueEx(hKey, KEY_ProxyEnable, 0, winreg.REG_DWORD, 0)  # 禁用代理
-                    winreg.SetValueEx(hKey, KEY_ProxyServer, 0, winreg.REG_SZ, "")  # 清除代理服务器
-                    winreg.SetValueEx(hKey, KEY_ProxyOverride, 0, winreg.REG_SZ, DEFAULT_PROXY_IGNORE)  # 保持忽略地址
-                    winreg.CloseKey(hKey)
-
-                    # 通知系统代理设置已更改
-                    import ctypes
-                    INTERNET_OPTION_SETTINGS_CHANGED = 39
-                    INTERNET_OPTION_REFRESH = 37
-                    internet_set_option = ctypes.windll.Wininet.InternetSetOptionW
-                    internet_set_option(0, INTERNET_OPTION_SETTINGS_CHANGED, 0, 0)
-                    internet_set_option(0, INTERNET_OPTION_REFRESH, 0, 0)
-
+                    self._write_windows_proxy(0, "")
                     logger.info("系统代理已关闭")
                 except Exception as e:
                     logger.error(f"清除系统代理失败: {e}")
@@ -311,18 +341,9 @@ class ProxyServer:
                             service, "off"
                         ], check=True)
             else:
-                # Linux清除系统代理
-                bashrc_path = os.path.expanduser("~/.bashrc")
-                if os.path.exists(bashrc_path):
-                    with open(bashrc_path, "r") as f:
-                        lines = f.readlines()
-                    
-                    with open(bashrc_path, "w") as f:
-                        for line in lines:
-                            if not any(x in line for x in ["http_proxy", "https_proxy", "HTTP_PROXY", "HTTPS_PROXY"]):
-                                f.write(line)
-                    
-                    subprocess.run(["source", "~/.bashrc"], shell=True, check=True)
+                # Linux清除系统代理：清空代理环境变量文件
+                self._write_proxy_env("")
+                self._ensure_bashrc_hook()
             
             logger.info("System proxy cleared")
         except Exception as e:
@@ -331,5 +352,5 @@ class ProxyServer:
 
     async def reload_host_rules(self):
         """重新加载Host规则"""
-        await self.load_host_rules()
+        await self.load_host_rules(force=True)
         logger.info("Host rules reloaded") 
\ No newline at end of file
@@ -1,35 +1,75 @@
 from mitmproxy import ctx
 from mitmproxy.http import HTTPFlow
 import re
+from collections import OrderedDict
 from typing import List, Dict, Optional
 import logging
 
+from app.proxy.matcher import MultiPatternMatcher, UnionPattern, build_union, literal_form
+
+# (method, url)判定结果缓存的最大条目数
+DECISION_CACHE_SIZE = 4096
+
 class FilterRule:
     """过滤规则"""
     def __init__(self, pattern: str, filter_type: str = "url"):
         self.pattern = pattern
         self.filter_type = filter_type
         self.regex = re.compile(pattern)
+        # 等价于字面量的规则由匹配器按字符串判断，不走正则
+        self.is_literal = literal_form(pattern) is not None
 
 class TrafficFilter:
     """流量过滤器"""
     
     def __init__(self):
         self.rules: List[FilterRule] = []
+        self._matchers: Dict[str, MultiPatternMatcher] = {}  # 按规则类型合并的匹配器
+        self._header_re: Optional[UnionPattern] = None  # 请求头规则合并的正则
+        # url/method规则的判定结果按(method, url)缓存(LRU)，规则变化时清空
+        self._decision_cache: OrderedDict = OrderedDict()
+        
+    def _compile(self, rules: List[FilterRule], filter_types) -> Dict[str, Optional[object]]:
+        """编译指定类型的匹配器，不修改当前状态；规则无法编译时抛出re.error"""
+        compiled = {}
+        for filter_type in filter_types:
+            typed = [r for r in rules if r.filter_type == filter_type]
+            if not typed:
+                compiled[filter_type] = None
+            elif filter_type == "header":
+                compiled[filter_type] = build_union([r.pattern for r in typed])
+            else:
+                compiled[filter_type] = MultiPatternMatcher([r.pattern for r in typed])
+        return compiled
+        
+    def _commit(self, rules: List[FilterRule], compiled: Dict[str, Optional[object]]):
+        """编译成功后一并替换规则列表和匹配器"""
+        self.rules = rules
+        for filter_type, matcher in compiled.items():
+            if filter_type == "header":
+                self._header_re = matcher
+            elif matcher is None:
+                self._matchers.pop(filter_type, None)
+            else:
+                self._matchers[filter_type] = matcher
+        self._decision_cache.clear()
         
     def add_rule(self, pattern: str, filter_type: str = "url"):
-        """添加过滤规则"""
+        """添加过滤规则，编译失败时规则和匹配器保持不变"""
         try:
-            rule = FilterRule(pattern, filter_type)
-            self.rules.append(rule)
-            logging.info(f"Added filter rule: {pattern} ({filter_type})")
+            rules = self.rules + [FilterRule(pattern, filter_type)]
+            compiled = self._compile(rules, [filter_type])
         except re.error as e:
             logging.error(f"Invalid regex pattern: {pattern}")
             raise ValueError(f"Invalid regex pattern: {e}")
+        self._commit(rules, compiled)
+        logging.info(f"Added filter rule: {pattern} ({filter_type})")
             
     def remove_rule(self, pattern: str):
         """移除过滤规则"""
-        self.rules = [r for r in self.rules if r.pattern != pattern]
+        removed = {r.filter_type for r in self.rules if r.pattern == pattern}
+        rules = [r for r in self.rules if r.pattern != pattern]
+        self._commit(rules, self._compile(rules, removed))
         logging.info(f"Removed filter rule: {pattern}")
         
     def request(self, flow: HTTPFlow) -> None:
@@ -38,21 +78,40 @@ class TrafficFilter:
             flow.kill()
             logging.info(f"Filtered request: {flow.request.pretty_url}")
             
+    def _match_url_method(self, method: str, url: str) -> bool:
+        """检查url和method规则"""
+        matcher = self._matchers.get("url")
+        if matcher and matcher.any_match(url):
+            return True
+        matcher = self._matchers.get("method")
+        return bool(matcher and matcher.any_match(method))
+        
     def _should_filter(self, flow: HTTPFlow) -> bool:
-        """检查是否应该过滤该请求"""
-        for rule in self.rules:
-            if rule.filter_type == "url":
-                if rule.regex.search(flow.request.pretty_url):
-                    return True
-            elif rule.filter_type == "method":
-                if rule.regex.search(flow.request.method):
-                    return True
-            elif rule.filter_type == "header":
-                for header, value in flow.request.headers.items():
-                    if rule.regex.search(f"{header}: {value}"):
-                        return True
-            elif rule.filter_type == "content_type":
-                content_type = flow.request.headers.get("Content-Type", "")
-                if rule.regex.search(content_type):
+        """检查是否应该过滤该请求：每种类型的规则只扫描一次"""
+        if not self._matchers and self._header_re is None:
+            return False
+        request = flow.request
+        
+        # url/method只依赖缓存键，重复请求直接复用判定结果
+        key = (request.method, request.pretty_url)
+        decision = self._decision_cache.get(key)
+        if decision is None:
+            decision = self._match_url_method(*key)
+            self._decision_cache[key] = decision
+            if len(self._decision_cache) > DECISION_CACHE_SIZE:
+                self._decision_cache.popitem(last=False)
+        else:
+            self._decision_cache.move_to_end(key)
+        if decision:
+            return True
+        
+        # 请求头规则依赖缓存键之外的内容，每次单独判断
+        header_re = self._header_re
+        if header_re is not None:
+            for header, value in request.headers.items():
+                if header_re.search(f"{header}: {value}"):
                     return True
-        return False 
\ No newline at end of file
+        matcher = self._matchers.get("content_type")
+        if matcher and matcher.any_match(request.headers.get("Content-Type", "")):
+            return True
+        return False
@@ -8,10 +8,12 @@ import logging
 from urllib.parse import urlparse
 import asyncio
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import re
 
 from ..db.mongo_client import get_database
 from ..db.mongo_crud import TrafficRecordDAO
+from .matcher import compile_rules
 from app.models.mongo_models import TrafficRecord
 from app.storage.har_writer import HarWriter
 
@@ -33,7 +35,11 @@ class TrafficHandler:
         self.loop = None
         self.mongo_dao = None
         self.filter_rules = []  # 过滤规则缓存
+        self.compiled_filters = {}  # 按类型预编译的匹配器
         self.har_writer = HarWriter()  # 新增：自动保存har文件
+        # HAR文件写入放到单独线程中按顺序执行，不阻塞事件循环
+        self._har_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="har-writer")
+        self._save_tasks = set()  # 进行中的MongoDB保存任务，保持引用避免被回收
         
     async def _init_mongo(self):
         """初始化MongoDB连接"""
@@ -43,71 +49,57 @@ class TrafficHandler:
             self.mongo_dao = TrafficRecordDAO(db)
             
     async def _load_filter_rules(self):
-        """从数据库加载过滤规则"""
+        """从数据库加载过滤规则，并按类型预编译为匹配器"""
         try:
             db = await get_database()
             rules = []
             async for rule in db.filter_rules.find({"enabled": True}):
+                # 跳过非法规则，避免单条规则导致整个规则集不可用
+                try:
+                    re.compile(rule["pattern"])
+                except re.error as e:
+                    logger.error(f"Skip invalid filter rule '{rule['pattern']}': {e}")
+                    continue
                 rules.append({
                     "pattern": rule["pattern"],
                     "type": rule["type"],
                     "description": rule.get("description", "")
                 })
+            self.compiled_filters = compile_rules(rules)
             self.filter_rules = rules
             logger.info(f"Loaded {len(rules)} filter rules")
         except Exception as e:
             logger.error(f"Failed to load filter rules: {e}")
             # 数据库连接失败时，使用空的规则集，不影响代理启动
             self.filter_rules = []
+            self.compiled_filters = {}
+
+    def _match_rules(self, rule_type: str, target: str) -> bool:
+        """检查目标是否命中某类型的任一已编译规则"""
+        matcher = self.compiled_filters.get(rule_type)
+        return matcher is not None and matcher.any_match(target)
 
     def _should_filter_request(self, flow: HTTPFlow) -> bool:
         """检查是否应该过滤该请求"""
-        logger.debug(f"Checking filter rules for URL: {flow.request.pretty_url}")
-        logger.debug(f"Available filter rules: {len(self.filter_rules)}")
-        
-        for rule in self.filter_rules:
-            try:
-                pattern = re.compile(rule["pattern"])
-                logger.debug(f"Testing rule: {rule['pattern']} (type: {rule['type']})")
-                
-                if rule["type"] == "url":
-                    if pattern.search(flow.request.pretty_url):
-                        logger.info(f"✓ Filtered by URL rule '{rule['pattern']}': {flow.request.pretty_url}")
-                        return True
-                    else:
-                        logger.debug(f"✗ URL rule '{rule['pattern']}' did not match: {flow.request.pretty_url}")
-                elif rule["type"] == "host":
-                    if pattern.search(flow.request.pretty_host):
-                        logger.info(f"✓ Filtered by host rule '{rule['pattern']}': {flow.request.pretty_host}")
-                        return True
-                    else:
-                        logger.debug(f"✗ Host rule '{rule['pattern']}' did not match: {flow.request.pretty_host}")
-                elif rule["type"] == "content-type":
-                    content_type = flow.request.headers.get("Content-Type", "")
-                    if pattern.search(content_type):
-                        logger.info(f"✓ Filtered by content-type rule '{rule['pattern']}': {content_type}")
-                        return True
-                    else:
-                        logger.debug(f"✗ Content-type rule '{rule['pattern']}' did not match: {content_type}")
-                elif rule["type"] == "method":
-                    if pattern.search(flow.request.method):
-                        logger.info(f"✓ Filtered by method rule '{rule['pattern']}': {flow.request.method}")
-                        return True
-                    else:
-                        logger.debug(f"✗ Method rule '{rule['pattern']}' did not match: {flow.request.method}")
-            except re.error as e:
-                logger.error(f"Invalid regex pattern '{rule['pattern']}': {e}")
-                continue
+        request = flow.request
+        targets = (
+            ("url", request.pretty_url),
+            ("host", request.pretty_host),
+            ("content-type", request.headers.get("Content-Type", "")),
+            ("method", request.method),
+        )
+        for rule_type, target in targets:
+            if self._match_rules(rule_type, target):
+                logger.info(f"✓ Filtered by {rule_type} rule: {target}")
+                return True
         
-        logger.debug(f"No filter rules matched for: {flow.request.pretty_url}")
+        logger.debug(f"No filter rules matched for: {request.pretty_url}")
         return False
 
     def _should_filter_response(self, flow: HTTPFlow) -> bool:
         """检查是否应该过滤该响应"""
         # 检查Content-Type过滤规则
         content_type = flow.response.headers.get('Content-Type', '').lower()
-        logger.info(f"Checking response filter rules for Content-Type: {content_type}")
-        logger.info(f"Available filter rules: {len(self.filter_rules)}")
         
         # 检查空响应体
         if not flow.response.content or len(flow.response.content) == 0:
@@ -119,26 +111,9 @@ class TrafficHandler:
             logger.info(f"✓ Filtered response with HTML content: {content_type}")
             return True
         
-        for rule in self.filter_rules:
-            try:
-                pattern = re.compile(rule["pattern"])
-                logger.info(f"Testing rule: {rule['pattern']} (type: {rule['type']})")
-                
-                if rule["type"] == "content-type":
-                    if pattern.search(content_type):
-                        logger.info(f"✓ Filtered response by content-type rule '{rule['pattern']}': {content_type}")
-                        return True
-                    else:
-                        logger.info(f"✗ Content-type rule '{rule['pattern']}' did not match: {content_type}")
-                elif rule["type"] == "response-size":
-                    # 检查响应体大小
-                    response_size = len(flow.response.content) if flow.response.content else 0
-                    if response_size == 0 and pattern.search(""):  # 空响应体
-                        logger.info(f"✓ Filtered response by size rule '{rule['pattern']}': empty body")
-                        return True
-            except re.error as e:
-                logger.error(f"Invalid regex pattern '{rule['pattern']}': {e}")
-                continue
+        if self._match_rules("content-type", content_type):
+            logger.info(f"✓ Filtered response by content-type rule: {content_type}")
+            return True
         
         logger.info(f"No filter rules matched for response: {flow.request.method} {flow.request.pretty_url}")
         return False
@@ -157,7 +132,24 @@ class TrafficHandler:
             except UnicodeDecodeError:
                 return content.hex()
 
+    def requestheaders(self, flow: HTTPFlow) -> None:
+        """收到请求头时按host规则判断是否需要捕获
+        
+        不需要保存的流量标记skip_capture，后续跳过捕获和请求/响应体的缓冲解析；
+        TrafficFilter的过滤规则仍然照常执行。
+        """
+        if self.proxy_server and not self.proxy_server.should_filter_host(flow.request.pretty_host):
+            flow.metadata["skip_capture"] = True
+            flow.request.stream = True
+
+    def responseheaders(self, flow: HTTPFlow) -> None:
+        """未捕获的流量直接流式转发响应体，不在内存中缓冲"""
+        if flow.metadata.get("skip_capture"):
+            flow.response.stream = True
+
     def request(self, flow: HTTPFlow) -> None:
+        if flow.metadata.get("skip_capture"):
+            return
         try:
             # 初始化MongoDB连接
             if not self.loop:
@@ -265,17 +257,14 @@ class TrafficHandler:
                 'har_file': None  # 暂时不保存HAR文件
             }
 
-            # 直接保存到HAR文件，避免事件循环冲突
-            try:
-                har_entry = self._to_har_entry(record_data)
-                self.har_writer.append_entry(har_entry)
-                logger.debug(f"Saved traffic record to HAR file")
-            except Exception as e:
-                logger.error(f"Failed to save traffic record to HAR file: {e}")
+            # 保存到HAR文件，交给写入线程执行
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(self._har_executor, self._write_har, record_data)
             
-            # 不再尝试异步保存到MongoDB，因为事件循环冲突问题
-            # 只记录一条日志，表明我们跳过了MongoDB保存
-            logger.info(f"Skipping MongoDB save due to event loop conflicts")
+            # 代理运行在应用的事件循环中，可以直接调度异步保存到MongoDB
+            task = loop.create_task(self._save_to_mongo(record_data))
+            self._save_tasks.add(task)
+            task.add_done_callback(self._save_tasks.discard)
 
             # 清理内存
             del self.flows[flow.request.id]
@@ -302,6 +291,14 @@ class TrafficHandler:
         except Exception as e:
             logger.error(f"Failed to save traffic record to MongoDB: {e}")
 
+    def _write_har(self, record_data: dict):
+        """写入HAR文件，在HAR写入线程中执行"""
+        try:
+            self.har_writer.append_entry(self._to_har_entry(record_data))
+            logger.debug("Saved traffic record to HAR file")
+        except Exception as e:
+            logger.error(f"Failed to save traffic record to HAR file: {e}")
+
     def _to_har_entry(self, record_data: dict) -> dict:
         """将record_data转换为HAR entry结构"""
         # HAR entry结构参考 app/parser/har_parser.py
@@ -0,0 +1,210 @@
+from typing import AnyStr, Dict, List, Optional, Tuple
+import re
+import logging
+
+try:
+    import hyperscan
+except ImportError:  # 可选依赖，未安装时回退到re
+    hyperscan = None
+
+# 合并后语义会改变的语法：全局内联标志、编号反向引用、命名反向引用和条件分组
+_UNION_UNSAFE = re.compile(r"\(\?[aiLmsux]+\)|\\[1-9]|\(\?P=|\(\?\(")
+
+def _as_text(pattern: AnyStr) -> str:
+    return pattern if isinstance(pattern, str) else pattern.decode("latin-1")
+
+class UnionPattern:
+    """多个正则的合并匹配，search()与re.Pattern.search一致
+    
+    可安全合并的模式编译为一个交替正则；含全局内联标志、反向引用等语法的模式
+    合并后会编译失败或改变语义，单独编译并逐个匹配。支持str和bytes模式。
+    """
+    
+    def __init__(self, patterns: List[AnyStr]):
+        # 逐个编译，单个模式非法时抛出re.error
+        compiled = [re.compile(p) for p in patterns]
+        safe, self._separate = [], []
+        for c in compiled:
+            (self._separate if _UNION_UNSAFE.search(_as_text(c.pattern)) else safe).append(c)
+        self._union = None
+        if safe:
+            sep, group = ("|", "(?:%s)") if isinstance(safe[0].pattern, str) else (b"|", b"(?:%s)")
+            try:
+                self._union = re.compile(sep.join(group % c.pattern for c in safe))
+            except re.error:
+                # 如重复的命名分组，无法合并时全部逐个匹配
+                self._separate = compiled
+                
+    def search(self, target: AnyStr) -> Optional[re.Match]:
+        if self._union is not None:
+            m = self._union.search(target)
+            if m is not None:
+                return m
+        for c in self._separate:
+            m = c.search(target)
+            if m is not None:
+                return m
+        return None
+
+def build_union(patterns: List[AnyStr]) -> UnionPattern:
+    """将多个正则合并为单个交替正则，无法安全合并的模式单独匹配"""
+    return UnionPattern(patterns)
+
+# 正则元字符；模式中不含未转义的元字符时可按普通字符串匹配
+_REGEX_META = frozenset('.^$*+?{}[]|()\\')
+
+def literal_form(pattern: str) -> Optional[Tuple[bool, bool, str]]:
+    """判断正则是否等价于字面量匹配
+    
+    支持可选的^/$锚点和\\.这类标点转义，返回(锚定开头, 锚定结尾, 字面量)；
+    含有其他正则语法时返回None。
+    """
+    start = pattern.startswith('^')
+    if start:
+        pattern = pattern[1:]
+    end = pattern.endswith('$') and not pattern.endswith('\\$')
+    if end:
+        pattern = pattern[:-1]
+    chars = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            # 只有转义标点是字面量，\d、\w等是字符类
+            if i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+                chars.append(pattern[i + 1])
+                i += 2
+                continue
+            return None
+        if c in _REGEX_META:
+            return None
+        chars.append(c)
+        i += 1
+    return start, end, ''.join(chars)
+
+class MultiPatternMatcher:
+    """多模式匹配器：判断目标是否命中任一正则
+    
+    等价于字面量的模式（如cdn\\.、^image/、\\.net$）用字符串的in/startswith/
+    endswith/==判断，其余模式在安装了hyperscan时编译为一个Hyperscan数据库
+    (HS_MODE_BLOCK)，否则使用re合并后的交替正则。Hyperscan不支持的语法同样回退到re。
+    """
+    
+    def __init__(self, patterns: List[str]):
+        self.patterns = list(patterns)
+        exact, prefixes, suffixes, contains, regex = set(), [], [], [], []
+        for p in self.patterns:
+            form = literal_form(p)
+            if form is None:
+                regex.append(p)
+                continue
+            start, end, literal = form
+            if start and end:
+                exact.add(literal)
+            elif start:
+                prefixes.append(literal)
+            elif end:
+                suffixes.append(literal)
+            else:
+                contains.append(literal)
+        self._exact = exact
+        self._prefixes = tuple(prefixes)
+        self._suffixes = tuple(suffixes)
+        self._contains = tuple(contains)
+        self._regex_patterns = regex
+        self._union = build_union(regex) if regex else None
+        self._db = self._compile_hyperscan(regex) if regex else None
+        
+    @staticmethod
+    def _compile_hyperscan(patterns: List[str]):
+        if hyperscan is None:
+            return None
+        try:
+            db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+            flag = (hyperscan.HS_FLAG_UTF8
+                    | hyperscan.HS_FLAG_SINGLEMATCH
+                    | hyperscan.HS_FLAG_ALLOWEMPTY)
+            db.compile(
+                expressions=[p.encode('utf-8') for p in patterns],
+                ids=list(range(len(patterns))),
+                elements=len(patterns),
+                flags=[flag] * len(patterns)
+            )
+            return db
+        except Exception as e:
+            logging.warning(f"Hyperscan compile failed, falling back to re: {e}")
+            return None
+            
+    def any_match(self, target: str) -> bool:
+        """检查目标是否命中任一模式"""
+        if not self.patterns:
+            return False
+        if target in self._exact:
+            return True
+        if self._prefixes and target.startswith(self._prefixes):
+            return True
+        if self._suffixes and target.endswith(self._suffixes):
+            return True
+        for literal in self._contains:
+            if literal in target:
+                return True
+        if self._union is None:
+            return False
+        if self._db is None or not target:
+            return self._union.search(target) is not None
+        matched = [False]
+        
+        def on_match(pattern_id, start, end, flags, context):
+            matched[0] = True
+            return True  # 命中即停止扫描
+            
+        try:
+            self._db.scan(target.encode('utf-8'), match_event_handler=on_match)
+        except hyperscan.ScanTerminated:
+            # 回调返回True中止扫描时抛出，属于正常的命中路径
+            pass
+        return matched[0]
+
+
+def group_by_type(rules: List[dict]) -> Dict[str, List[dict]]:
+    """按规则类型分组"""
+    groups = {}
+    for r in rules:
+        groups.setdefault(r["type"], []).append(r)
+    return groups
+
+def compile_rules(rules: List[dict]) -> Dict[str, MultiPatternMatcher]:
+    """将规则按类型编译为匹配器: {type: MultiPatternMatcher}"""
+    return {
+        t: MultiPatternMatcher([r["pattern"] for r in rs])
+        for t, rs in group_by_type(rules).items()
+    }
+
+
+# 域名后缀树中规则终点的键，值为该规则是否包含子域名
+_RULE_END = None
+
+def build_host_trie(rules: Dict[str, bool]) -> dict:
+    """按反转标签构建域名规则树: {host: include_subdomains}，规则终点记录是否包含子域名"""
+    trie = {}
+    for host, include_subdomains in rules.items():
+        node = trie
+        for label in reversed(host.split(".")):
+            node = node.setdefault(label, {})
+        node[_RULE_END] = include_subdomains
+    return trie
+
+def match_host_trie(trie: dict, host: str) -> bool:
+    """检查域名是否命中规则树中的任一规则"""
+    # 从顶级域名向下遍历：走完所有标签时命中规则为精确匹配，
+    # 中途命中包含子域名的规则为子域名匹配
+    node = trie
+    labels = host.split(".")
+    for i in range(len(labels) - 1, -1, -1):
+        node = node.get(labels[i])
+        if node is None:
+            return False
+        include_subdomains = node.get(_RULE_END)
+        if include_subdomains is not None and (i == 0 or include_subdomains):
+            return True
+    return False
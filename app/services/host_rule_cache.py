@@ -0,0 +1,49 @@
+from typing import List, Optional
+import time
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+class HostRuleCache:
+    """Host规则进程内缓存
+    
+    规则只在管理接口中变更，读取时直接返回缓存；变更后调用invalidate()，
+    下次读取时从数据库刷新。缓存超过ttl秒后也会刷新，以便读到直接改库的变更。
+    """
+    
+    # 缺失的可选字段在服务端补默认值，保证每个文档字段齐全
+    _PROJECTION = {
+        "host": 1,
+        "enabled": 1,
+        "description": {"$ifNull": ["$description", None]},
+        "includeSubdomains": {"$ifNull": ["$includeSubdomains", False]}
+    }
+    
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self.rules: Optional[List[dict]] = None
+        self.rev = 0
+        self.loaded_at = 0.0
+        
+    def invalidate(self):
+        """规则变更后使缓存失效"""
+        self.rules = None
+        self.rev += 1
+        
+    async def refresh(self, db: AsyncIOMotorDatabase) -> List[dict]:
+        """从数据库重新加载规则"""
+        rev = self.rev
+        rules = await db.host_rules.find({}, self._PROJECTION).batch_size(500).to_list(length=None)
+        # 加载期间规则又发生变更时不写入缓存，避免保存旧数据
+        if rev == self.rev:
+            self.rules = rules
+            self.loaded_at = time.monotonic()
+        return rules
+        
+    async def get(self, db: AsyncIOMotorDatabase) -> List[dict]:
+        """获取规则，缓存为空或过期时从数据库加载"""
+        if self.rules is None or time.monotonic() - self.loaded_at > self.ttl:
+            return await self.refresh(db)
+        return self.rules
+
+# 全局Host规则缓存
+host_rule_cache = HostRuleCache()
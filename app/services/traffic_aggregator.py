@@ -0,0 +1,178 @@
+from typing import List, Optional, Tuple
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from ..db.mongo_crud import get_records_version
+
+# BSON类型名到Python类型名的映射，保持聚合结果与原有输出一致
+_BSON_TYPE_NAMES = {
+    "string": "str",
+    "int": "int",
+    "long": "int",
+    "double": "float",
+    "decimal": "float",
+    "bool": "bool",
+    "object": "dict",
+    "array": "list",
+    "null": "NoneType",
+    "missing": "NoneType",
+    "date": "datetime",
+    "objectId": "ObjectId",
+}
+
+_API_KEY = {"host": "$host", "path": "$path", "method": "$method"}
+
+# 每个状态码保留的响应示例数
+RESPONSE_EXAMPLES = 3
+
+# $topN需要MongoDB 5.2+，低版本回退到$push后截取
+TOPN_MIN_VERSION = (5, 2)
+
+# 参数聚合：在MongoDB端展开request_params，先按参数值去重，再按参数名汇总类型和全部取值
+_PARAMS_PIPELINE = [
+    {"$project": {
+        "host": 1, "path": 1, "method": 1,
+        "params_kv": {"$objectToArray": {"$ifNull": ["$request_params", {}]}}
+    }},
+    {"$unwind": "$params_kv"},
+    {"$group": {
+        "_id": {**_API_KEY, "name": "$params_kv.k", "value": "$params_kv.v"},
+        "type": {"$first": {"$type": "$params_kv.v"}}
+    }},
+    {"$group": {
+        "_id": {"host": "$_id.host", "path": "$_id.path", "method": "$_id.method", "name": "$_id.name"},
+        "types": {"$addToSet": "$type"},
+        "examples": {"$push": "$_id.value"}
+    }}
+]
+
+_RESPONSE_KEY = {**_API_KEY, "status": "$response_status"}
+_NON_NULL = {"$filter": {"input": "$examples", "cond": {"$ne": ["$$this", None]}}}
+
+# 响应聚合：按状态码汇总响应体类型，并保留最多3个非空示例（非空响应体优先），
+# 示例数组大小固定，分组内存与记录数无关
+_RESPONSES_PIPELINE = [
+    {"$project": {
+        "host": 1, "path": 1, "method": 1, "response_status": 1, "response_body": 1,
+        "has_body": {"$cond": [{"$eq": [{"$ifNull": ["$response_body", None]}, None]}, 0, 1]}
+    }},
+    {"$group": {
+        "_id": _RESPONSE_KEY,
+        "schemas": {"$addToSet": {"$type": "$response_body"}},
+        "examples": {"$topN": {
+            "n": RESPONSE_EXAMPLES,
+            "sortBy": {"has_body": -1},
+            "output": "$response_body"
+        }}
+    }},
+    {"$project": {"schemas": 1, "examples": _NON_NULL}}
+]
+
+# MongoDB 5.2以下：收集全部响应体后过滤空值再截取
+_RESPONSES_PIPELINE_LEGACY = [
+    {"$group": {
+        "_id": _RESPONSE_KEY,
+        "schemas": {"$addToSet": {"$type": "$response_body"}},
+        "examples": {"$push": "$response_body"}
+    }},
+    {"$project": {"schemas": 1, "examples": {"$slice": [_NON_NULL, RESPONSE_EXAMPLES]}}}
+]
+
+_COUNT_PIPELINE = [
+    {"$group": {"_id": _API_KEY, "count": {"$sum": 1}}}
+]
+
+def _type_name(bson_type: str) -> str:
+    return _BSON_TYPE_NAMES.get(bson_type, bson_type)
+
+def _api_key(_id: dict) -> tuple:
+    return (_id["host"], _id["path"], _id["method"])
+
+async def supports_topn(db: AsyncIOMotorDatabase) -> bool:
+    """服务端版本是否支持$topN"""
+    info = await db.command("buildInfo")
+    return tuple(info["versionArray"][:2]) >= TOPN_MIN_VERSION
+
+async def aggregate(db: AsyncIOMotorDatabase, topn: bool = True) -> List[dict]:
+    """按(host, path, method)聚合流量记录，统计参数和响应"""
+    collection = db.traffic_records
+    responses_pipeline = _RESPONSES_PIPELINE if topn else _RESPONSES_PIPELINE_LEGACY
+    count_groups, param_groups, resp_groups = await asyncio.gather(
+        collection.aggregate(_COUNT_PIPELINE, allowDiskUse=True).to_list(length=None),
+        collection.aggregate(_PARAMS_PIPELINE, allowDiskUse=True).to_list(length=None),
+        collection.aggregate(responses_pipeline, allowDiskUse=True).to_list(length=None),
+    )
+    
+    # 先按计数结果建立API条目，参数和响应直接追加到对应条目，不再构建中间映射
+    apis = {}
+    for group in count_groups:
+        _id = group["_id"]
+        apis[_api_key(_id)] = {
+            "host": _id["host"],
+            "path": _id["path"],
+            "method": _id["method"],
+            "params": [],
+            "responses": [],
+            "count": group["count"]
+        }
+        
+    for g in param_groups:
+        _id = g["_id"]
+        api = apis.get(_api_key(_id))
+        if api is not None:
+            api["params"].append({
+                "name": _id["name"],
+                "types": list(dict.fromkeys(_type_name(t) for t in g["types"])),
+                "examples": list(dict.fromkeys(str(v) for v in g["examples"]))
+            })
+            
+    for g in resp_groups:
+        _id = g["_id"]
+        api = apis.get(_api_key(_id))
+        if api is not None:
+            api["responses"].append({
+                "status": _id["status"],
+                "schemas": [f"<class '{_type_name(t)}'>" for t in g["schemas"]],
+                "examples": g["examples"]
+            })
+    return list(apis.values())
+
+class TrafficAggregator:
+    """API聚合结果缓存
+    
+    以traffic_records的版本号为缓存键：版本未变化时直接返回上次结果，
+    版本号保存在metadata集合中，多进程部署下同样有效。
+    """
+    
+    def __init__(self):
+        self._cache: Optional[Tuple[int, List[dict]]] = None  # (版本, 结果)
+        self._lock: Optional[asyncio.Lock] = None
+        self._topn: Optional[bool] = None  # 服务端是否支持$topN，首次聚合时检测
+        
+    def _cached(self, version: int) -> Optional[List[dict]]:
+        if self._cache is None or self._cache[0] != version:
+            return None
+        return self._cache[1]
+        
+    async def get(self, db: AsyncIOMotorDatabase) -> List[dict]:
+        """获取聚合结果，版本号变化时重新聚合"""
+        version = await get_records_version(db)
+        value = self._cached(version)
+        if value is not None:
+            return value
+            
+        # 延迟创建锁，确保绑定到运行中的事件循环
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            value = self._cached(version)
+            if value is None:
+                if self._topn is None:
+                    self._topn = await supports_topn(db)
+                value = await aggregate(db, self._topn)
+                self._cache = (version, value)
+            return value
+
+# 全局聚合器实例
+aggregator = TrafficAggregator()
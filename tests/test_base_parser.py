@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+
+from app.parser.base import BaseParser
+
+
+def _old_infer(value):
+    """改用正则判断之前的实现，作为对照"""
+    try:
+        int(value)
+        return 'integer'
+    except ValueError:
+        try:
+            float(value)
+            return 'number'
+        except ValueError:
+            if value.lower() in ('true', 'false'):
+                return 'boolean'
+            try:
+                datetime.fromisoformat(value)
+                return 'datetime'
+            except ValueError:
+                return 'string'
+
+
+class TestInferParamType:
+    """参数类型推断测试"""
+
+    @pytest.mark.parametrize("value, expected", [
+        ("42", "integer"),
+        ("-7", "integer"),
+        (" 42 ", "integer"),
+        ("1_000", "integer"),
+        ("٤٢", "integer"),
+        ("3.14", "number"),
+        (".5", "number"),
+        ("1e5", "number"),
+        ("-1.5E-3", "number"),
+        ("nan", "number"),
+        ("-Infinity", "number"),
+        ("true", "boolean"),
+        ("FALSE", "boolean"),
+        ("2024-01-01", "datetime"),
+        ("2024-01-01T10:00:00", "datetime"),
+        ("abc", "string"),
+        ("12abc", "string"),
+        ("1__0", "string"),
+        ("", "string"),
+        ("²", "string"),
+    ])
+    def test_infer(self, value, expected):
+        """推断结果与原有int()/float()实现一致"""
+        assert BaseParser()._infer_param_type(value) == expected
+        assert _old_infer(value) == expected
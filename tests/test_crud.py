@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from app.db.crud import FilterRuleCRUD, TrafficRecordCRUD
+from app.db.database import Database
+from app.db.models import TrafficRecord
+
+
+def _database():
+    database = Database("sqlite://")
+    database.create_all()
+    return database
+
+
+class TestKeysetPaging:
+    """键集分页测试"""
+
+    def test_pages_cover_all_records_in_order(self):
+        """逐页翻完所有记录，不重复不遗漏，created_at相同时按id排序"""
+        database = _database()
+        base = datetime(2024, 1, 1)
+        with database.get_session() as session:
+            for i in range(25):
+                session.add(TrafficRecord(
+                    id=f"{i:04d}",
+                    service_name="svc",
+                    api_path="/a",
+                    method="GET",
+                    url="http://svc/a",
+                    # 每5条使用相同的created_at，覆盖游标中id的比较
+                    created_at=base + timedelta(seconds=i // 5)
+                ))
+            session.add(TrafficRecord(
+                id="other", service_name="other", api_path="/a", method="GET", url="http://other/a",
+                created_at=base
+            ))
+
+        with database.get_session() as session:
+            seen, cursor = [], None
+            while True:
+                page = TrafficRecordCRUD.get_by_service(session, "svc", cursor=cursor, limit=7)
+                if not page:
+                    break
+                seen.extend(r.id for r in page)
+                cursor = TrafficRecordCRUD.next_cursor(page)
+
+        expected = sorted((f"{i:04d}" for i in range(25)), key=lambda x: (int(x) // 5, x), reverse=True)
+        assert seen == expected
+
+    def test_next_cursor_of_empty_page(self):
+        """空页没有下一页游标"""
+        assert TrafficRecordCRUD.next_cursor([]) is None
+
+
+class TestActiveRules:
+    """激活规则缓存测试"""
+
+    def test_returns_plain_dicts(self):
+        """返回与会话无关的字典，规则变更后重新加载"""
+        database = _database()
+        with database.get_session() as session:
+            FilterRuleCRUD.create(session, {"pattern": r"\.js$", "filter_type": "url"})
+            FilterRuleCRUD.create(session, {"pattern": "off", "filter_type": "url", "is_active": False})
+        with database.get_session() as session:
+            rules = FilterRuleCRUD.get_active_rules(session)
+        assert [(r["pattern"], r["filter_type"]) for r in rules] == [(r"\.js$", "url")]
+
+        # 修改返回值不影响缓存
+        rules[0]["pattern"] = "changed"
+        with database.get_session() as session:
+            assert FilterRuleCRUD.get_active_rules(session)[0]["pattern"] == r"\.js$"
+            rule_id = FilterRuleCRUD.get_active_rules(session)[0]["id"]
+            FilterRuleCRUD.update(session, rule_id, {"is_active": False})
+            assert FilterRuleCRUD.get_active_rules(session) == []
@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.db.mongo_crud import EndpointCounter
+
+
+class _Endpoints:
+    """记录bulk_write调用的api_endpoints集合，fail为True时写入失败"""
+
+    def __init__(self):
+        self.fail = False
+        self.writes = []
+
+    async def bulk_write(self, ops, ordered):
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.writes.append(ops)
+
+
+class _DB:
+    def __init__(self):
+        self.api_endpoints = _Endpoints()
+
+
+def _increments(ops):
+    return {
+        (op._filter["host"], op._filter["path"], op._filter["method"]): (
+            op._doc["$inc"]["traffic_count"], op._doc["$max"]["last_seen"]
+        )
+        for op in ops
+    }
+
+
+class TestEndpointCounter:
+    """端点计数器测试"""
+
+    def test_flush_merges_counts(self):
+        """同一端点的计数合并为一次写入，last_seen取最大值"""
+        db = _DB()
+        counter = EndpointCounter()
+        t1, t2 = datetime(2024, 1, 1), datetime(2024, 1, 2)
+        counter.add("h", "/a", "GET", last_seen=t2)
+        counter.add("h", "/a", "GET", n=2, last_seen=t1)
+        counter.add("h", "/b", "POST", last_seen=t1)
+        asyncio.run(counter.flush(db))
+        [ops] = db.api_endpoints.writes
+        assert _increments(ops) == {("h", "/a", "GET"): (3, t2), ("h", "/b", "POST"): (1, t1)}
+        asyncio.run(counter.flush(db))
+        assert len(db.api_endpoints.writes) == 1  # 没有新增量时不写入
+
+    def test_failed_flush_merges_back(self):
+        """写入失败时增量合并回计数表，与失败后新增的计数一起在下次写入"""
+        db = _DB()
+        counter = EndpointCounter()
+        t1, t2 = datetime(2024, 1, 1), datetime(2024, 1, 2)
+        counter.add("h", "/a", "GET", n=2, last_seen=t1)
+        db.api_endpoints.fail = True
+        with pytest.raises(RuntimeError):
+            asyncio.run(counter.flush(db))
+        counter.add("h", "/a", "GET", last_seen=t2)
+        db.api_endpoints.fail = False
+        asyncio.run(counter.flush(db))
+        [ops] = db.api_endpoints.writes
+        assert _increments(ops) == {("h", "/a", "GET"): (3, t2)}
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+from app.api import filter_routes
+
+
+class _FailingRules:
+    """bulk_write时抛出指定BulkWriteError的规则集合"""
+
+    def __init__(self, code):
+        self.code = code
+
+    async def bulk_write(self, ops, ordered):
+        raise BulkWriteError({"writeErrors": [{"index": 1, "code": self.code, "errmsg": "error"}]})
+
+
+class _DB:
+    def __init__(self, rules):
+        self.filter_rules = rules
+
+
+class TestApplyPreset:
+    """应用预设规则测试"""
+
+    def test_duplicate_rule_returns_400(self):
+        """命中唯一索引时返回400"""
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(filter_routes.apply_preset("cdn_hosts", _DB(_FailingRules(11000))))
+        assert exc.value.status_code == 400
+
+    def test_other_write_error_returns_500(self):
+        """其他写入错误返回500"""
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(filter_routes.apply_preset("cdn_hosts", _DB(_FailingRules(2))))
+        assert exc.value.status_code == 500
+
+    def test_presets_have_no_duplicate_rules(self):
+        """预设内部没有重复的(pattern, type)"""
+        for preset in filter_routes.PRESET_RULES.values():
+            keys = [(r["pattern"], r["type"]) for r in preset["rules"]]
+            assert len(keys) == len(set(keys)), preset["id"]
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return list(self.docs)
+
+
+class _StoredRules:
+    """只支持find的规则集合，返回预置的已启用规则"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        return _Cursor(self.docs)
+
+
+class TestCheckRuleSet:
+    """写入前规则集校验测试"""
+
+    def test_legacy_invalid_rule_is_skipped(self):
+        """数据库中遗留的非法规则不影响新规则写入"""
+        db = _DB(_StoredRules([
+            {"pattern": "(unclosed", "type": "url"},
+            {"pattern": r"(?i)\.js$", "type": "url"},
+        ]))
+        rule = filter_routes.FilterRule(pattern=r"/static/", type="url", enabled=True)
+        asyncio.run(filter_routes._check_rule_set(db, rule))
@@ -0,0 +1,81 @@
+import pytest
+from mitmproxy.test import tflow
+
+from app.proxy.filters import TrafficFilter
+
+
+def _flow(url="http://example.com/api/users", method="GET", headers=None):
+    flow = tflow.tflow()
+    flow.request.method = method
+    flow.request.url = url
+    for name, value in (headers or {}).items():
+        flow.request.headers[name] = value
+    return flow
+
+
+class TestTrafficFilter:
+    """流量过滤器测试"""
+
+    def test_url_and_method_rules(self):
+        """url和method规则命中时过滤"""
+        traffic_filter = TrafficFilter()
+        traffic_filter.add_rule(r"\.js$", "url")
+        traffic_filter.add_rule(r"^OPTIONS$", "method")
+        assert traffic_filter._should_filter(_flow("http://example.com/app.js"))
+        assert traffic_filter._should_filter(_flow(method="OPTIONS"))
+        assert not traffic_filter._should_filter(_flow())
+
+    def test_invalid_rule_leaves_state_unchanged(self):
+        """非法规则抛出ValueError，已有规则和匹配器不变"""
+        traffic_filter = TrafficFilter()
+        traffic_filter.add_rule(r"/static/", "url")
+        with pytest.raises(ValueError):
+            traffic_filter.add_rule(r"(unclosed", "url")
+        assert [r.pattern for r in traffic_filter.rules] == ["/static/"]
+        traffic_filter.add_rule(r"/assets/", "url")
+        assert traffic_filter._should_filter(_flow("http://example.com/static/a.png"))
+        assert traffic_filter._should_filter(_flow("http://example.com/assets/a.png"))
+
+    def test_remove_rule(self):
+        """移除规则后不再过滤，并清空判定缓存"""
+        traffic_filter = TrafficFilter()
+        traffic_filter.add_rule(r"/static/", "url")
+        flow = _flow("http://example.com/static/a.png")
+        assert traffic_filter._should_filter(flow)
+        traffic_filter.remove_rule(r"/static/")
+        assert not traffic_filter._should_filter(flow)
+
+    def test_header_rules(self):
+        """请求头规则按“名称: 值”匹配"""
+        traffic_filter = TrafficFilter()
+        traffic_filter.add_rule(r"^X-Debug: 1$", "header")
+        assert traffic_filter._should_filter(_flow(headers={"X-Debug": "1"}))
+        assert not traffic_filter._should_filter(_flow(headers={"X-Debug": "0"}))
+
+    def test_header_rule_with_global_flag(self):
+        """含(?i)的请求头规则不影响同类型其他规则"""
+        traffic_filter = TrafficFilter()
+        traffic_filter.add_rule(r"(?i)^x-debug:", "header")
+        traffic_filter.add_rule(r"^Cookie: session=", "header")
+        assert traffic_filter._should_filter(_flow(headers={"X-DEBUG": "1"}))
+        assert traffic_filter._should_filter(_flow(headers={"Cookie": "session=abc"}))
+        assert not traffic_filter._should_filter(_flow(headers={"Accept": "*/*"}))
+
+    def test_header_rule_semantics(self):
+        """请求头规则匹配解码后的文本，重复的头合并后匹配"""
+        traffic_filter = TrafficFilter()
+        traffic_filter.add_rule(r"^X-User: 张三$", "header")
+        traffic_filter.add_rule(r"^X-Tag: a, b$", "header")
+        assert traffic_filter._should_filter(_flow(headers={"X-User": "张三"}))
+        flow = _flow()
+        flow.request.headers.set_all("X-Tag", ["a", "b"])
+        assert traffic_filter._should_filter(flow)
+
+    def test_uncaptured_flow_still_filtered(self):
+        """不捕获的流量仍然执行过滤规则"""
+        traffic_filter = TrafficFilter()
+        traffic_filter.add_rule(r"/admin", "url")
+        flow = _flow(url="http://example.com/admin")
+        flow.metadata["skip_capture"] = True
+        traffic_filter.request(flow)
+        assert flow.error is not None
@@ -0,0 +1,70 @@
+import base64
+import json
+
+from app.parser.har_parser import HARParser
+
+
+def _entry(url, method="GET", status=200, mime="application/json", text='{"ok": true}',
+           encoding=None, post_data=None):
+    content = {"mimeType": mime, "text": text}
+    if encoding:
+        content["encoding"] = encoding
+    request = {"method": method, "url": url, "headers": [{"name": "Content-Type", "value": mime}]}
+    if post_data is not None:
+        request["postData"] = post_data
+    return {
+        "startedDateTime": "2024-01-01T00:00:00.000Z",
+        "time": 12.5,
+        "request": request,
+        "response": {"status": status, "headers": [], "content": content},
+    }
+
+
+def _write_har(tmp_path, entries):
+    path = tmp_path / "test.har"
+    path.write_text(json.dumps({"log": {"entries": entries}}), encoding="utf-8")
+    return str(path)
+
+
+class TestHARParser:
+    """HAR解析器测试"""
+
+    def test_parse_entries(self, tmp_path):
+        """解析请求参数、请求体和JSON响应体"""
+        path = _write_har(tmp_path, [
+            _entry("https://api.example.com/users?id=1&tag=a&tag=b", method="POST",
+                   post_data={"mimeType": "application/json", "text": '{"name": "x"}'}),
+        ])
+        [entry] = HARParser().parse_file(path)
+        assert entry["host"] == "api.example.com"
+        assert entry["path"] == "/users"
+        assert entry["request_params"] == {"id": "1", "tag": ["a", "b"]}
+        assert entry["request_body"] == {"name": "x"}
+        assert entry["response_body"] == {"ok": True}
+
+    def test_noise_and_host_filter(self, tmp_path):
+        """静态资源被过滤，host_filter只保留指定host"""
+        path = _write_har(tmp_path, [
+            _entry("https://api.example.com/app.js?v=1"),
+            _entry("https://api.example.com/logo.PNG"),
+            _entry("https://api.example.com/socket.io/?EIO=4"),
+            _entry("https://api.example.com/orders"),
+            _entry("https://other.example.com/orders"),
+        ])
+        parser = HARParser()
+        assert [e["url"] for e in parser.parse_file(path)] == [
+            "https://api.example.com/orders",
+            "https://other.example.com/orders",
+        ]
+        assert [e["host"] for e in parser.iter_entries(path, "other.example.com")] == ["other.example.com"]
+
+    def test_base64_response(self, tmp_path):
+        """base64编码的JSON响应被解码，非JSON二进制内容不保存"""
+        encoded = base64.b64encode(b'{"a": 1}').decode()
+        path = _write_har(tmp_path, [
+            _entry("https://api.example.com/a", text=encoded, encoding="base64"),
+            _entry("https://api.example.com/b", mime="application/octet-stream", text="AAEC", encoding="base64"),
+        ])
+        first, second = HARParser().parse_file(path)
+        assert first["response_body"] == {"a": 1}
+        assert second["response_body"] is None
@@ -0,0 +1,103 @@
+import asyncio
+import re
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.host_routes import _check_duplicate_host, is_valid_host
+from app.db.mongo_client import mongo_manager
+from app.proxy.matcher import build_host_trie, match_host_trie
+
+# 改为查表校验之前使用的正则
+_OLD_HOST_RE = r'^[a-zA-Z0-9][-a-zA-Z0-9]*(\.[a-zA-Z0-9][-a-zA-Z0-9]*)*$'
+
+
+class TestHostTrie:
+    """域名规则树测试"""
+
+    RULES = {
+        "api.example.com": False,
+        "example.org": True,
+        "svc.internal.example.org": False,
+        "localhost": False,
+    }
+
+    @pytest.mark.parametrize("host, expected", [
+        ("api.example.com", True),       # 精确匹配
+        ("v2.api.example.com", False),   # 不含子域名的规则不匹配子域名
+        ("example.com", False),          # 规则的父域名
+        ("example.org", True),           # 包含子域名的规则本身
+        ("a.b.example.org", True),       # 子域名
+        ("badexample.org", False),       # 只有后缀字符串相同
+        ("example.org.cn", False),
+        ("localhost", True),
+        ("local", False),
+        ("other.net", False),
+    ])
+    def test_match(self, host, expected):
+        """精确匹配、子域名匹配和不匹配的域名"""
+        assert match_host_trie(build_host_trie(self.RULES), host) is expected
+
+    def test_empty_rules(self):
+        """没有规则时不匹配任何域名"""
+        assert not match_host_trie(build_host_trie({}), "example.com")
+
+
+class TestIsValidHost:
+    """域名格式校验测试"""
+
+    @pytest.mark.parametrize("host", [
+        "example.com", "a", "a-b.c-d.e", "127.0.0.1", "xn--fiq228c.com", "EXAMPLE.COM",
+        "", ".", "-a.com", "a..com", "a.com.", "a_b.com", "a.-b.com", "a com",
+        "例子.com", "a.com:8080", "a/b",
+    ])
+    def test_agrees_with_old_regex(self, host):
+        """长度限制以内的域名与原正则结果一致"""
+        assert is_valid_host(host) == bool(re.match(_OLD_HOST_RE, host))
+
+    def test_length_limits(self):
+        """段长超过63或总长超过253时不合法（原正则不限制长度）"""
+        assert is_valid_host("a" * 63 + ".com")
+        assert not is_valid_host("a" * 64 + ".com")
+        assert not is_valid_host(".".join(["a" * 50] * 5) + ".com")
+
+    def test_trailing_newline(self):
+        """结尾换行不合法（原正则的$会放过结尾换行）"""
+        assert not is_valid_host("example.com\n")
+
+
+class _HostRules:
+    """记录find_one查询的host_rules集合"""
+
+    def __init__(self, existing):
+        self.existing = existing
+        self.queries = []
+
+    async def find_one(self, query, projection=None):
+        self.queries.append(query)
+        return {"_id": 1} if query["host"] in self.existing else None
+
+
+class _DB:
+    def __init__(self, existing=()):
+        self.host_rules = _HostRules(existing)
+
+
+class TestCheckDuplicateHost:
+    """域名重复检查测试"""
+
+    def test_query_without_unique_index(self, monkeypatch):
+        """唯一索引未创建时写入前查询重复域名"""
+        monkeypatch.setattr(mongo_manager, "created_indexes", set())
+        db = _DB(existing={"example.com"})
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(_check_duplicate_host(db, "example.com"))
+        assert exc.value.status_code == 400
+        asyncio.run(_check_duplicate_host(db, "other.com"))
+
+    def test_skip_with_unique_index(self, monkeypatch):
+        """唯一索引已创建时交给索引拒绝重复"""
+        monkeypatch.setattr(mongo_manager, "created_indexes", {"host_rules.host_1"})
+        db = _DB(existing={"example.com"})
+        asyncio.run(_check_duplicate_host(db, "example.com"))
+        assert db.host_rules.queries == []
@@ -0,0 +1,134 @@
+import re
+
+import pytest
+
+from app.proxy import matcher as matcher_module
+from app.proxy.matcher import MultiPatternMatcher, build_union, compile_rules, literal_form
+
+
+class TestBuildUnion:
+    """合并正则测试"""
+
+    def test_global_flag_rule(self):
+        """含全局内联标志(?i)的规则不影响其他规则的合并"""
+        union = build_union([r"(?i)cdn", r"\.js$", r"^/static/"])
+        assert union.search("img.CDN.example.com")
+        assert union.search("/app/main.js")
+        assert union.search("/static/a.png")
+        assert not union.search("/api/users")
+
+    def test_backreference_rule(self):
+        """反向引用在合并后仍指向本规则的分组"""
+        union = build_union([r"(x)y", r"(a)\1"])
+        assert union.search("baab")
+        assert not union.search("ab")
+
+    def test_duplicate_group_names(self):
+        """重复的命名分组无法合并时逐个匹配"""
+        union = build_union([r"(?P<n>foo)", r"(?P<n>bar)"])
+        assert union.search("xbar")
+        assert not union.search("baz")
+
+    def test_bytes_patterns(self):
+        """bytes模式同样支持"""
+        union = build_union([rb"(?i)x-token", rb"^Cookie"])
+        assert union.search(b"X-TOKEN: 1")
+        assert not union.search(b"Accept: */*")
+
+    def test_invalid_pattern(self):
+        """单个非法模式抛出re.error"""
+        with pytest.raises(re.error):
+            build_union([r"ok", r"(unclosed"])
+
+    def test_compile_rules_with_global_flag(self):
+        """同类型中有(?i)规则时compile_rules不会失败"""
+        matchers = compile_rules([
+            {"pattern": r"(?i)cdn", "type": "host"},
+            {"pattern": r"tracking\.", "type": "host"},
+            {"pattern": r"^/api/", "type": "url"},
+        ])
+        assert set(matchers) == {"host", "url"}
+
+
+# 与逐条re.search对照的模式和目标：覆盖字面量、锚点、字符类和无法合并的语法
+AGREEMENT_PATTERNS = [
+    r"cdn\.", r"^image/", r"\.net$", r"^text/html$", r"\.(css|js)(\?|$)",
+    r"api/v\d+/", r"(?i)tracking", r"(a)\1",
+]
+AGREEMENT_TARGETS = [
+    "", "cdn.example.com", "image/png", "a.image/png", "cloudfront.net",
+    "cloudfront.net.cn", "text/html", "text/html; charset=utf-8", "/app.css?v=1",
+    "/app.jsx", "/api/v2/users", "/api/vx/users", "TRACKING.example.com", "xaay",
+]
+
+
+def _expected(patterns, target):
+    return any(re.search(p, target) for p in patterns)
+
+
+class TestMultiPatternMatcher:
+    """多模式匹配器测试"""
+
+    # 含反向引用时Hyperscan编译失败，整体回退到re；去掉后Hyperscan可用时走Hyperscan
+    @pytest.mark.parametrize("patterns", [AGREEMENT_PATTERNS, AGREEMENT_PATTERNS[:-1]])
+    @pytest.mark.parametrize("target", AGREEMENT_TARGETS)
+    def test_agrees_with_re(self, patterns, target):
+        """any_match与逐条re.search结果一致"""
+        matcher = MultiPatternMatcher(patterns)
+        assert matcher.any_match(target) == _expected(patterns, target)
+
+    @pytest.mark.parametrize("pattern", AGREEMENT_PATTERNS)
+    @pytest.mark.parametrize("target", AGREEMENT_TARGETS)
+    def test_single_pattern_agrees_with_re(self, pattern, target):
+        """单个模式（字面量或正则）与re.search结果一致"""
+        assert MultiPatternMatcher([pattern]).any_match(target) == bool(re.search(pattern, target))
+
+    def test_re_fallback(self, monkeypatch):
+        """未安装hyperscan时使用re合并正则"""
+        monkeypatch.setattr(matcher_module, "hyperscan", None)
+        matcher = MultiPatternMatcher(AGREEMENT_PATTERNS)
+        assert matcher._db is None
+        for target in AGREEMENT_TARGETS:
+            assert matcher.any_match(target) == _expected(AGREEMENT_PATTERNS, target)
+
+    @pytest.mark.skipif(matcher_module.hyperscan is None, reason="未安装hyperscan")
+    def test_hyperscan_stops_on_first_hit(self):
+        """Hyperscan命中即中止扫描，不向调用方抛出异常"""
+        matcher = MultiPatternMatcher([r"a.c", r"x+y", r"\d{3}"])
+        assert matcher._db is not None
+        assert matcher.any_match("zzabc xxy 123")
+        assert not matcher.any_match("nothing here")
+
+
+class TestLiteralForm:
+    """字面量识别测试"""
+
+    @pytest.mark.parametrize("pattern, expected", [
+        (r"cdn\.", (False, False, "cdn.")),
+        (r"^image/", (True, False, "image/")),
+        (r"\.net$", (False, True, ".net")),
+        (r"^text/html$", (True, True, "text/html")),
+        (r"price\$", (False, False, "price$")),
+        (r"a.c", None),
+        (r"\d+", None),
+        (r"(a|b)", None),
+        (r"x*", None),
+    ])
+    def test_literal_form(self, pattern, expected):
+        """只有等价于字面量的模式返回(锚定开头, 锚定结尾, 字面量)"""
+        assert literal_form(pattern) == expected
+
+    @pytest.mark.parametrize("pattern", [r"cdn\.", r"^image/", r"\.net$", r"^text/html$", r"price\$"])
+    @pytest.mark.parametrize("target", ["cdn.x", "image/png", "x.net", "text/html", "price$5", "other"])
+    def test_literal_agrees_with_re(self, pattern, target):
+        """按字面量判断的结果与re.search一致"""
+        start, end, literal = literal_form(pattern)
+        if start and end:
+            matched = target == literal
+        elif start:
+            matched = target.startswith(literal)
+        elif end:
+            matched = target.endswith(literal)
+        else:
+            matched = literal in target
+        assert matched == bool(re.search(pattern, target))
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from app.db.mongo_client import MongoManager
+
+
+class _Collection:
+    def __init__(self, name, created, failing):
+        self.name = name
+        self.created = created
+        self.failing = failing
+
+    async def create_index(self, keys, **options):
+        if self.name in self.failing:
+            raise RuntimeError("E11000 duplicate key error")
+        self.created.append((self.name, tuple(keys)))
+        return "_".join(f"{k}_{d}" for k, d in keys)
+
+
+class _DB:
+    def __init__(self, failing=()):
+        self.created = []
+        self.failing = failing
+
+    def __getitem__(self, name):
+        return _Collection(name, self.created, self.failing)
+
+
+def _manager(db):
+    manager = MongoManager()
+    manager.db = db
+    return manager
+
+
+class TestInitIndexes:
+    """索引初始化测试"""
+
+    def test_failed_index_does_not_skip_others(self):
+        """某个索引创建失败时其余索引照常创建，最后统一报错"""
+        db = _DB(failing={"filter_rules"})
+        with pytest.raises(RuntimeError, match="filter_rules"):
+            asyncio.run(_manager(db).init_indexes())
+        collections = {name for name, _ in db.created}
+        assert "host_rules" in collections
+        assert "filter_rules" not in collections
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.db import mongo_crud
+from app.models import mongo_models
+
+
+class _Collection:
+    """记录写入调用的集合，failed_indexes中的文档插入失败"""
+
+    def __init__(self, calls, failed_indexes=()):
+        self.calls = calls
+        self.failed_indexes = failed_indexes
+
+    async def insert_many(self, docs, ordered):
+        self.calls.append(("insert", len(docs)))
+        if self.failed_indexes:
+            errors = [{"index": i, "code": 11000} for i in self.failed_indexes]
+            raise BulkWriteError({"writeErrors": errors})
+
+    async def bulk_write(self, ops, ordered):
+        self.calls.append(("update", [op._filter["_id"] for op in ops]))
+
+
+class _DB:
+    def __init__(self, failed_indexes=()):
+        self.calls = []
+        self.test_results = _Collection(self.calls, failed_indexes)
+        self.test_cases = _Collection(self.calls)
+
+
+def _results(count):
+    return [
+        mongo_models.TestResult(test_case_id=ObjectId(), status="passed", duration=1.0,
+                   request={}, response={}, assertions=[])
+        for _ in range(count)
+    ]
+
+
+class TestBulkCreate:
+    """批量写入测试结果测试"""
+
+    def test_insert_before_update(self):
+        """结果插入完成后再更新用例状态"""
+        db = _DB()
+        results = _results(2)
+        ids = asyncio.run(mongo_crud.TestResultDAO(db).bulk_create(results))
+        assert len(ids) == 2
+        assert db.calls == [("insert", 2), ("update", [r.test_case_id for r in results])]
+
+    def test_partial_insert_failure(self):
+        """部分插入失败时只更新插入成功的结果对应的用例"""
+        db = _DB(failed_indexes=[1])
+        results = _results(3)
+        with pytest.raises(BulkWriteError):
+            asyncio.run(mongo_crud.TestResultDAO(db).bulk_create(results))
+        assert db.calls == [
+            ("insert", 3),
+            ("update", [results[0].test_case_id, results[2].test_case_id]),
+        ]
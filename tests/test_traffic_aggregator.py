@@ -0,0 +1,115 @@
+import asyncio
+import os
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from app.services import traffic_aggregator
+from app.services.traffic_aggregator import TrafficAggregator, aggregate, supports_topn
+
+MONGO_URI = os.getenv("TEST_MONGO_URI", "mongodb://localhost:27017")
+
+RECORDS = [
+    {"host": "a.com", "path": "/users", "method": "GET", "request_params": {"page": 1},
+     "response_status": 200, "response_body": None},
+    {"host": "a.com", "path": "/users", "method": "GET", "request_params": {"page": 2},
+     "response_status": 200, "response_body": {"id": 1}},
+    {"host": "a.com", "path": "/users", "method": "GET", "request_params": {"page": 1},
+     "response_status": 404, "response_body": "missing"},
+]
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class _Records:
+    """记录执行过的聚合管道"""
+
+    def __init__(self):
+        self.pipelines = []
+
+    def aggregate(self, pipeline, allowDiskUse):
+        self.pipelines.append(pipeline)
+        return _Cursor([])
+
+
+class _DB:
+    def __init__(self, version):
+        self.version = version
+        self.traffic_records = _Records()
+
+    async def command(self, name):
+        assert name == "buildInfo"
+        return {"versionArray": self.version}
+
+
+def _mongo_available() -> bool:
+    try:
+        MongoClient(MONGO_URI, serverSelectionTimeoutMS=500).admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+
+
+class TestPipelineSelection:
+    """按服务端版本选择聚合管道测试"""
+
+    @pytest.mark.parametrize("version,expected", [
+        ([4, 4, 18, 0], False),
+        ([5, 0, 9, 0], False),
+        ([5, 2, 0, 0], True),
+        ([7, 0, 2, 0], True),
+    ])
+    def test_supports_topn(self, version, expected):
+        """5.2及以上版本支持$topN"""
+        assert asyncio.run(supports_topn(_DB(version))) is expected
+
+    def test_legacy_server_avoids_new_operators(self, monkeypatch):
+        """低版本服务端不使用$topN/$firstN"""
+        async def version(db):
+            return 1
+        monkeypatch.setattr(traffic_aggregator, "get_records_version", version)
+        db = _DB([4, 4, 0, 0])
+        asyncio.run(TrafficAggregator().get(db))
+        pipelines = repr(db.traffic_records.pipelines)
+        assert "$topN" not in pipelines and "$firstN" not in pipelines
+
+
+@pytest.mark.mongo
+@pytest.mark.skipif(not _mongo_available(), reason="MongoDB不可用")
+class TestAggregateLive:
+    """在真实MongoDB上执行聚合管道"""
+
+    def _run(self, topn):
+        async def run():
+            client = AsyncIOMotorClient(MONGO_URI)
+            db = client["api_test_aggregator_test"]
+            try:
+                await db.traffic_records.insert_many([dict(r) for r in RECORDS])
+                if topn and not await supports_topn(db):
+                    pytest.skip("MongoDB版本低于5.2")
+                return await aggregate(db, topn)
+            finally:
+                await client.drop_database("api_test_aggregator_test")
+                client.close()
+        return asyncio.run(run())
+
+    @pytest.mark.parametrize("topn", [True, False])
+    def test_aggregate(self, topn):
+        """两种管道输出一致：参数保留全部取值，响应只保留非空示例"""
+        [api] = self._run(topn)
+        assert api["count"] == 3
+        [param] = api["params"]
+        assert param["types"] == ["int"]
+        assert sorted(param["examples"]) == ["1", "2"]
+        responses = {r["status"]: r for r in api["responses"]}
+        assert responses[200]["examples"] == [{"id": 1}]
+        assert sorted(responses[200]["schemas"]) == ["<class 'NoneType'>", "<class 'dict'>"]
+        assert responses[404]["examples"] == ["missing"]
@@ -0,0 +1,127 @@
+import asyncio
+
+from app.db.writer import BatchWriter
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class TestBatchWriter:
+    """批量写入器测试"""
+
+    def test_batches_queued_records(self):
+        """队列中已有的记录合并为一批写入，且不超过batch_size"""
+        batches = []
+
+        async def flush(batch):
+            batches.append(list(batch))
+
+        async def main():
+            writer = BatchWriter(flush, batch_size=3)
+            for i in range(5):
+                await writer.put(i)
+            writer.start()
+            await asyncio.sleep(0.01)
+            await writer.stop()
+
+        _run(main())
+        assert batches == [[0, 1, 2], [3, 4]]
+
+    def test_linger_collects_late_records(self):
+        """linger时间内到达的记录并入同一批"""
+        batches = []
+
+        async def flush(batch):
+            batches.append(list(batch))
+
+        async def main():
+            writer = BatchWriter(flush, batch_size=10, linger=0.05)
+            writer.start()
+            await writer.put(1)
+            await asyncio.sleep(0.01)
+            await writer.put(2)
+            await asyncio.sleep(0.1)
+            await writer.stop()
+
+        _run(main())
+        assert batches == [[1, 2]]
+
+    def test_stop_drains_queue(self):
+        """stop()写入队列中剩余的记录"""
+        written = []
+
+        async def flush(batch):
+            written.extend(batch)
+
+        async def main():
+            writer = BatchWriter(flush, batch_size=2)
+            for i in range(5):
+                await writer.put(i)
+            await writer.stop()
+
+        _run(main())
+        assert written == [0, 1, 2, 3, 4]
+
+    def test_stop_waits_for_inflight_flush(self):
+        """stop()时正在进行的写入不会被取消，等待方都能拿到结果"""
+        written = []
+
+        async def flush(items):
+            await asyncio.sleep(0.05)
+            for value, future in items:
+                written.append(value)
+                future.set_result(value)
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            writer = BatchWriter(flush, batch_size=2)
+            writer.start()
+            futures = []
+            for i in range(4):
+                future = loop.create_future()
+                futures.append(future)
+                await writer.put((i, future))
+            await asyncio.sleep(0.01)  # 第一批正在写入
+            await writer.stop()
+            return await asyncio.wait_for(asyncio.gather(*futures), 1)
+
+        assert _run(main()) == [0, 1, 2, 3]
+        assert written == [0, 1, 2, 3]
+
+    def test_stop_during_linger(self):
+        """凑批期间stop()，已取出的记录仍会写入"""
+        written = []
+
+        async def flush(batch):
+            written.extend(batch)
+
+        async def main():
+            writer = BatchWriter(flush, batch_size=10, linger=1.0)
+            writer.start()
+            await writer.put(1)
+            await asyncio.sleep(0.01)
+            await writer.stop()
+
+        _run(main())
+        assert written == [1]
+
+    def test_flush_error_does_not_stop_writer(self):
+        """某一批写入失败后继续处理后续批次"""
+        written = []
+
+        async def flush(batch):
+            if batch == [0]:
+                raise RuntimeError("boom")
+            written.extend(batch)
+
+        async def main():
+            writer = BatchWriter(flush, batch_size=1)
+            writer.start()
+            await writer.put(0)
+            await writer.put(1)
+            await asyncio.sleep(0.01)
+            await writer.stop()
+
+        _run(main())
+        assert written == [1]